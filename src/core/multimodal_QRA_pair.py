@@ -6,8 +6,10 @@ Now uses the centralized reasoning engine for cleaner architecture.
 import os
 import json
 import yaml
+import threading
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
 from dotenv import load_dotenv
 
 # Import the reasoning engine
@@ -21,6 +23,17 @@ from core.reasoning_engine import (
 
 load_dotenv()
 
+# Each worker spends almost all of its time waiting on the API, so the pool is
+# sized for network round-trips rather than CPU cores.
+IO_WORKERS_PER_PROCESS = 16
+MAX_IO_WORKERS = 256
+
+def get_max_workers(config):
+    """Return the thread pool size for the I/O-bound LLM workload."""
+    if config.get("max_workers"):
+        return config["max_workers"]
+    return min(MAX_IO_WORKERS, config.get("num_process", 4) * IO_WORKERS_PER_PROCESS)
+
 def filter_data(tmpdata):
     """Filter and prepare data for processing."""
     filtered_data = []
@@ -34,8 +47,27 @@ def filter_data(tmpdata):
     print(f"Original data size: {len(tmpdata)}, Filtered data size: {len(filtered_data)}")
     return filtered_data
 
+def group_duplicates(items):
+    """Group items that ask the same question about the same set of images.
+
+    The reference answer is part of the key: the shared result carries group[0]'s
+    ground truth and verdict, so items with different answers must not be merged.
+    """
+    groups = {}
+    for item in items:
+        dedup_key = (
+            item['Open-ended Verifiable Question'],
+            tuple(sorted(item.get('img_urls', []))),
+            item.get('Ground-True Answer', ''),
+        )
+        groups.setdefault(dedup_key, []).append(item)
+    return list(groups.values())
+
 def process_sample(d, gpt_instance, strategies, config, prompts):
-    """Process a single data sample with advanced reasoning."""
+    """Process a single data sample with advanced reasoning.
+
+    ``prompts`` is the config's precomputed ``PromptBundle``.
+    """
     try:
         query_history = []
         response_history = []
@@ -46,7 +78,7 @@ def process_sample(d, gpt_instance, strategies, config, prompts):
         ground_truth = d.get('Ground-True Answer', '')
         
         # Step 1: Initial reasoning
-        initial_prompt = prompts.get('query_prompt_init', '').format(question)
+        initial_prompt = prompts.query_init.format(question)
         query_history.append(initial_prompt)
         
         initial_response = gpt_instance.call(
@@ -108,7 +140,7 @@ def main():
     strategies = ReasoningStrategies(reasoning_config, gpt_instance)
     
     config = reasoning_config.config
-    prompts = reasoning_config.prompts
+    prompts = reasoning_config.prompt_bundle
     
     # Load and filter data
     with open(config["data_path"], encoding='utf-8') as f:
@@ -146,16 +178,25 @@ def main():
     unprocessed_data = [item for item in data if get_item_key(item) not in processed_keys]
     print(f"Items remaining for processing: {len(unprocessed_data)} of {len(data)}")
 
+    # Duplicate (question, images) pairs are only sent through the LLM chain once
+    groups = group_duplicates(unprocessed_data)
+    if len(groups) < len(unprocessed_data):
+        print(f"Deduplicated {len(unprocessed_data)} items into {len(groups)} unique requests")
+
     # Process items
-    def process_wrapper(d):
-        success, result = process_sample(d, gpt_instance, strategies, config, prompts)
-        if success:
-            # Save progress immediately
-            key = get_item_key(d)
-            progress_data[key] = result
+    progress_lock = threading.Lock()
+
+    def process_wrapper(group):
+        success, result = process_sample(group[0], gpt_instance, strategies, config, prompts)
+        if not success:
+            return 0
+        # Save progress immediately, fanning the shared result out to every duplicate
+        with progress_lock:
+            for d in group:
+                progress_data[get_item_key(d)] = {**result, 'process_id': d['process_id']}
             with open(progress_file, 'w', encoding='utf-8') as f:
                 json.dump(progress_data, f, ensure_ascii=False, indent=2)
-        return success
+        return len(group)
     
     # Create progress file if needed
     if not os.path.exists(progress_file):
@@ -164,18 +205,31 @@ def main():
     
     # Process unprocessed items
     if unprocessed_data:
-        with ThreadPoolExecutor(max_workers=config.get("num_process", 4)) as executor:
-            results = list(executor.map(process_wrapper, unprocessed_data))
+        results = []
+        with ThreadPoolExecutor(max_workers=get_max_workers(config), thread_name_prefix="llm") as executor:
+            futures = [executor.submit(process_wrapper, group) for group in groups]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Processing items"):
+                results.append(future.result())
         
         print(f"Completed processing {sum(results)} of {len(unprocessed_data)} items")
     else:
         print("No new items to process")
     
-    # Load final results and save
-    with open(progress_file, 'r', encoding='utf-8') as f:
-        final_progress_data = json.load(f)
-    
-    final_data = list(final_progress_data.values())
+    # Build both outputs from the in-memory progress in a single pass
+    final_data = []
+    simplified_data = []
+    with progress_lock:
+        for item in progress_data.values():
+            final_data.append(item)
+            simplified_data.append({
+                'img_urls': item.get('img_urls', []),
+                'question': item.get('Question', ''),
+                'reasoning': item.get('Complex_CoT', ''),
+                'answer': item.get('Response', ''),
+                'ground_truth': item.get('Ground-True Answer', ''),
+                'correct': item.get('Correct', False),
+                'strategies_used': item.get('Strategies_Used', [])
+            })
     
     # Save full output
     output_path = f"{task_name}_{len(final_data)}.json"
@@ -184,20 +238,6 @@ def main():
     with open(output_path, 'w', encoding='utf-8') as file:
         json.dump(final_data, file, ensure_ascii=False, indent=2)
     
-    # Generate simplified output
-    simplified_data = []
-    for item in final_data:
-        simplified_item = {
-            'img_urls': item.get('img_urls', []),
-            'question': item.get('Question', ''),
-            'reasoning': item.get('Complex_CoT', ''),
-            'answer': item.get('Response', ''),
-            'ground_truth': item.get('Ground-True Answer', ''),
-            'correct': item.get('Correct', False),
-            'strategies_used': item.get('Strategies_Used', [])
-        }
-        simplified_data.append(simplified_item)
-    
     # Save simplified output
     simplified_output_path = f"simplified_{task_name}_{len(simplified_data)}.json"
     print(f"Saving simplified output with {len(simplified_data)} items to {simplified_output_path}")
@@ -4,12 +4,21 @@ Extracted from multimodal_QRA_pair.py for use across different applications.
 """
 
 import os
+import json
+import asyncio
 import base64
+import hashlib
 import requests
 import yaml
 import re
+import math
+import time
 import logging
-from openai import OpenAI
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -18,6 +27,21 @@ load_dotenv()
 # Setup logging
 logger = logging.getLogger(__name__)
 
+DEFAULT_VERIFY_PROMPT = '<Model Response>\n{}\n</Model Response>\n\n<Reference Answer>\n{}\n</Reference Answer>\n\nBased on the model response and reference answer above, is the model\'s conclusion correct?\nSimply answer "True" if correct, "False" if incorrect dont add anything else.'
+
+# With stream_early_stop enabled, generation is cut once a conclusion header has been
+# followed by content and a paragraph break (the part extract_final_conclusion uses).
+_CONCLUSION_MARKER_RE = re.compile(
+    r"\*\*'?Final Conclusion'?\*\*|final diagnosis:|in conclusion[,:]",
+    re.IGNORECASE
+)
+_CONCLUSION_END_RE = re.compile(r"\S.*?\n\n", re.DOTALL)
+STREAM_MIN_CHUNKS = 512
+
+# Prompt templates resolved once per config so hot paths use attribute access
+# instead of repeated dict lookups with defaults.
+PromptBundle = namedtuple('PromptBundle', ['query_init', 'verify', 'guided', 'natural', 'final', 'strategies'])
+
 class ReasoningConfig:
     """Centralized configuration management."""
     
@@ -49,6 +73,101 @@ class ReasoningConfig:
         
         with open(prompts_path, 'r') as f:
             self.prompts = yaml.safe_load(f)
+        
+        self.prompt_bundle = build_prompt_bundle(self.prompts)
+
+def build_prompt_bundle(prompts):
+    """Resolve the prompt templates used on every sample into a PromptBundle."""
+    return PromptBundle(
+        query_init=prompts.get('query_prompt_init', ''),
+        verify=prompts.get('verify_prompt', DEFAULT_VERIFY_PROMPT),
+        guided=prompts.get('guided_prompt', ''),
+        natural=prompts.get('natural_reasoning_prompt'),
+        final=prompts.get('final_response_prompt', ''),
+        strategies=(
+            ('Backtracking', prompts.get('gen_prompt_rethink_Backtracking', '')),
+            ('Exploring New Paths', prompts.get('gen_prompt_rethink_Exploring_New_Path', '')),
+            ('Verification', prompts.get('gen_prompt_rethink_Verification', '')),
+            ('Correction', prompts.get('gen_prompt_rethink_Correction', ''))
+        )
+    )
+
+def _resolve_image_path(image_path, image_dir=None):
+    """Apply the same image_dir fallback that encode_image uses for relative paths."""
+    if not os.path.isabs(image_path) and image_dir:
+        return os.path.join(image_dir, os.path.basename(image_path))
+    return image_path
+
+class ResponseCache:
+    """
+    On-disk cache of model responses keyed by a SHA-256 of the full request
+    (endpoint, model, prompt, generation args and image identity), one file per entry.
+    """
+    
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def make_key(self, model, content, additional_args, image_urls=None, image_dir=None, url=None):
+        images = []
+        for img in image_urls or []:
+            if img.startswith(('http://', 'https://')):
+                images.append(img)
+            else:
+                # Local files are identified by path, mtime and size instead of hashing their bytes
+                path = _resolve_image_path(img, image_dir)
+                st = os.stat(path)
+                images.append(f"{os.path.abspath(path)}:{st.st_mtime_ns}:{st.st_size}")
+        payload = json.dumps([url, model, content, additional_args, images], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.txt"
+    
+    def get(self, key):
+        try:
+            return self._path(key).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+    
+    def set(self, key, response):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        # Write to a unique temp file and rename so concurrent readers never see a partial entry
+        temp_path = path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temp_path.write_text(response, encoding="utf-8")
+        os.replace(temp_path, path)
+
+class RateLimiter:
+    """
+    Spaces requests evenly to stay under a requests-per-minute ceiling.
+    
+    Thread-safe: each caller reserves the next free slot under a lock and then
+    sleeps (or awaits) outside it until that slot arrives.
+    """
+    
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self):
+        """Claim the next request slot and return the seconds to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+            return slot - now
+    
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+    
+    async def await_slot(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
 
 def encode_image(image_path, image_dir=None):
     """Encode image from local file or URL to base64"""
@@ -60,8 +179,7 @@ def encode_image(image_path, image_dir=None):
             return base64.b64encode(response.content).decode("utf-8")
         else:
             # Handle local file
-            if not os.path.isabs(image_path) and image_dir:
-                image_path = os.path.join(image_dir, os.path.basename(image_path))
+            image_path = _resolve_image_path(image_path, image_dir)
             
             with open(image_path, "rb") as image_file:
                 return base64.b64encode(image_file.read()).decode("utf-8")
@@ -69,6 +187,28 @@ def encode_image(image_path, image_dir=None):
         print(f"Error encoding image {image_path}: {str(e)}")
         raise
 
+class _ConclusionWatcher:
+    """Accumulate streamed text and report when a complete final conclusion has arrived."""
+    
+    def __init__(self):
+        self.text = ""
+        self.chunks = 0
+        self.scanned = 0
+        self.conclusion_start = None
+    
+    def feed(self, delta):
+        """Add one streamed chunk; return True once generation can be stopped."""
+        self.text += delta or ""
+        self.chunks += 1
+        # Only rescan the new tail (plus enough overlap for a split marker)
+        if self.conclusion_start is None:
+            marker = _CONCLUSION_MARKER_RE.search(self.text, max(0, self.scanned - 32))
+            self.scanned = len(self.text)
+            if marker:
+                self.conclusion_start = marker.end()
+        return (self.conclusion_start is not None and self.chunks > STREAM_MIN_CHUNKS
+                and _CONCLUSION_END_RE.search(self.text, self.conclusion_start) is not None)
+
 class MultimodalGPT:
     """Reusable GPT client for multimodal reasoning tasks."""
     
@@ -85,71 +225,200 @@ class MultimodalGPT:
         
         if not self.api_key:
             raise ValueError("OPEN_ROUTER_API_KEY environment variable not set")
+        
+        # Optional exact-match response cache; relative paths are taken from the project root
+        cache_dir = config.config.get("response_cache_dir")
+        if cache_dir and not os.path.isabs(cache_dir):
+            cache_dir = Path(__file__).resolve().parent.parent.parent / cache_dir
+        self.response_cache = ResponseCache(cache_dir) if cache_dir else None
+        
+        # Optional provider rate limit shared by every call made through this instance
+        requests_per_minute = config.config.get("requests_per_minute")
+        self.rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+    
+    def _cache_key(self, content, additional_args, image_urls, model, url=None):
+        if not self.response_cache:
+            return None
+        try:
+            return self.response_cache.make_key(
+                model or self.model_name, content, additional_args, image_urls,
+                self.config.config.get("images_dir"), str(url or self.api_url).rstrip("/")
+            )
+        except OSError:
+            # An unreadable local image is not cached; the call itself reports the error
+            return None
+    
+    def _build_api_params(self, content, additional_args, image_urls, model):
+        messages = [{
+            "role": "user",
+            "content": []
+        }]
+        
+        # Add text content
+        messages[0]["content"].append({"type": "text", "text": content})
+        
+        # Add image content
+        for img_url in image_urls or []:
+            encoded_image = encode_image(img_url, self.config.config.get("images_dir"))
+            image_url_with_prefix = f"data:image/jpeg;base64,{encoded_image}"
+            messages[0]["content"].append({
+                "type": "image_url", 
+                "image_url": {"url": image_url_with_prefix}
+            })
+        
+        # Set default parameters - VERY LOW temperature for OCR accuracy
+        return {
+            "model": model or self.model_name,
+            "messages": messages,
+            "max_tokens": additional_args.get("max_tokens", 20000),
+            "temperature": additional_args.get("temperature", 0.05)  # Near-deterministic for OCR
+        }
     
     def call(self, content, additional_args=None, image_urls=None, url=None, model=None):
         """Main API call method."""
         if additional_args is None:
             additional_args = {}
         
+        if image_urls and not isinstance(image_urls, list):
+            image_urls = [image_urls]
+        
+        cache_key = self._cache_key(content, additional_args, image_urls, model, url)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached:
+                return cached
+        
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+        
         client = OpenAI(
             base_url=url or self.api_url,
             api_key=self.api_key,
         )
 
         try:
-            messages = [{
-                "role": "user",
-                "content": []
-            }]
-            
-            # Add text content
-            messages[0]["content"].append({"type": "text", "text": content})
+            api_params = self._build_api_params(content, additional_args, image_urls, model)
             
-            # Add image content
-            if image_urls:
-                if isinstance(image_urls, list):
-                    for img_url in image_urls:
-                        encoded_image = encode_image(img_url, self.config.config.get("images_dir"))
-                        image_url_with_prefix = f"data:image/jpeg;base64,{encoded_image}"
-                        messages[0]["content"].append({
-                            "type": "image_url", 
-                            "image_url": {"url": image_url_with_prefix}
-                        })
-                else:
-                    # Single image case
-                    encoded_image = encode_image(image_urls, self.config.config.get("images_dir"))
-                    image_url_with_prefix = f"data:image/jpeg;base64,{encoded_image}"
-                    messages[0]["content"].append({
-                        "type": "image_url", 
-                        "image_url": {"url": image_url_with_prefix}
-                    })
+            if self.config.config.get("stream_early_stop", False):
+                response_content = self._stream_until_conclusion(client, api_params)
+            else:
+                response = client.chat.completions.create(**api_params)
+                response_content = response.choices[0].message.content
+            if not response_content:
+                raise ValueError("Empty response from API")
             
-            # Set default parameters - VERY LOW temperature for OCR accuracy
-            api_params = {
-                "model": model or self.model_name,
-                "messages": messages,
-                "max_tokens": additional_args.get("max_tokens", 20000),
-                "temperature": additional_args.get("temperature", 0.05)  # Near-deterministic for OCR
-            }
+            if cache_key:
+                self.response_cache.set(cache_key, response_content)
+            return response_content
             
-            response = client.chat.completions.create(**api_params)
+        except Exception as e:
+            print(f"API Error: {str(e)}")
+            raise ValueError(f"API Error: {str(e)}")
+
+    async def acall(self, client, content, additional_args=None, image_urls=None, model=None):
+        """Async counterpart of call() on a shared AsyncOpenAI client."""
+        if additional_args is None:
+            additional_args = {}
+        
+        if image_urls and not isinstance(image_urls, list):
+            image_urls = [image_urls]
+        
+        cache_key = self._cache_key(content, additional_args, image_urls, model, client.base_url)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached:
+                return cached
+        
+        if self.rate_limiter:
+            await self.rate_limiter.await_slot()
+        
+        try:
+            # Image encoding is blocking file I/O, so keep it off the event loop
+            api_params = await asyncio.to_thread(self._build_api_params, content, additional_args, image_urls, model)
             
-            response_content = response.choices[0].message.content
+            if self.config.config.get("stream_early_stop", False):
+                response_content = await self._astream_until_conclusion(client, api_params)
+            else:
+                response = await client.chat.completions.create(**api_params)
+                response_content = response.choices[0].message.content
             if not response_content:
                 raise ValueError("Empty response from API")
-                
+            
+            if cache_key:
+                self.response_cache.set(cache_key, response_content)
             return response_content
             
         except Exception as e:
             print(f"API Error: {str(e)}")
             raise ValueError(f"API Error: {str(e)}")
 
+    def _stream_until_conclusion(self, client, api_params):
+        """Stream a completion and stop once a complete final conclusion has been generated."""
+        stream = client.chat.completions.create(**api_params, stream=True)
+        watcher = _ConclusionWatcher()
+        try:
+            for chunk in stream:
+                if chunk.choices and watcher.feed(chunk.choices[0].delta.content):
+                    break
+        finally:
+            stream.close()
+        return watcher.text
+    
+    async def _astream_until_conclusion(self, client, api_params):
+        """Async counterpart of _stream_until_conclusion."""
+        stream = await client.chat.completions.create(**api_params, stream=True)
+        watcher = _ConclusionWatcher()
+        try:
+            async for chunk in stream:
+                if chunk.choices and watcher.feed(chunk.choices[0].delta.content):
+                    break
+        finally:
+            await stream.close()
+        return watcher.text
+    
     def text_only_call(self, content, additional_args=None):
         """Text-only processing for verification tasks - ZERO temperature for consistency."""
         if additional_args is None:
             additional_args = {"temperature": 0.0}  # Deterministic verification
         return self.call(content, additional_args, model="google/gemini-2.0-flash-001")
 
+    def batch_call(self, contents, image_urls_list=None, additional_args=None, model=None):
+        """Send several independent requests at once and return the responses in order.
+
+        Requests run concurrently on one event loop, at most ``max_concurrency``
+        (config, default 256) in flight. A failed request yields its exception in
+        place of the response so one bad item does not discard the rest of the batch.
+        """
+        if not contents:
+            return []
+        if image_urls_list is None:
+            image_urls_list = [None] * len(contents)
+        return asyncio.run(self._abatch_call(contents, image_urls_list, additional_args, model))
+
+    async def _abatch_call(self, contents, image_urls_list, additional_args, model):
+        semaphore = asyncio.Semaphore(self.config.config.get("max_concurrency", 256))
+        client = AsyncOpenAI(base_url=self.api_url, api_key=self.api_key)
+
+        async def _call_one(content, image_urls):
+            async with semaphore:
+                try:
+                    return await self.acall(client, content, additional_args, image_urls=image_urls, model=model)
+                except Exception as e:
+                    return e
+
+        try:
+            return await asyncio.gather(*(
+                _call_one(content, image_urls) for content, image_urls in zip(contents, image_urls_list)
+            ))
+        finally:
+            await client.close()
+
+    def text_only_batch_call(self, contents, additional_args=None):
+        """Batched counterpart of text_only_call."""
+        if additional_args is None:
+            additional_args = {"temperature": 0.0}
+        return self.batch_call(contents, additional_args=additional_args, model="google/gemini-2.0-flash-001")
+
     def retry_call(self, content, additional_args=None, image_urls=None, url=None, max_attempts=2):
         """Retry call with limited attempts."""
         if additional_args is None:
@@ -163,10 +432,130 @@ class MultimodalGPT:
                     raise
                 print(f"Attempt {attempt + 1} failed: {e}. Retrying...")
 
+class BatchedTextCaller:
+    """
+    Coalesces text_only_call requests from many threads into text_only_batch_call
+    batches, so concurrent requests share one connection pool instead of each
+    opening its own client.
+    
+    A batch is sent once ``batch_size`` requests are queued or ``max_wait``
+    seconds after its first request arrived; batches are sent concurrently.
+    ``submit()`` blocks until its own response is back and raises its own error.
+    """
+    
+    def __init__(self, gpt_instance, batch_size=16, max_wait=0.05, max_batches=4):
+        self.gpt = gpt_instance
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue = queue.SimpleQueue()
+        self._executor = ThreadPoolExecutor(max_workers=max_batches, thread_name_prefix="text_batch")
+        self._collector = threading.Thread(target=self._collect, name="text_batch_collector", daemon=True)
+        self._collector.start()
+    
+    def submit(self, content, additional_args=None):
+        """Queue a text-only request and wait for its response."""
+        if additional_args is None:
+            additional_args = {"temperature": 0.0}
+        future = Future()
+        self._queue.put((content, additional_args, future))
+        return future.result()
+    
+    def _collect(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._dispatch(batch)
+                    return
+                batch.append(request)
+            self._dispatch(batch)
+    
+    def _dispatch(self, batch):
+        # text_only_batch_call takes one set of generation args, so group by them
+        groups = {}
+        for content, additional_args, future in batch:
+            key = json.dumps(additional_args, sort_keys=True)
+            groups.setdefault(key, (additional_args, []))[1].append((content, future))
+        for additional_args, requests in groups.values():
+            self._executor.submit(self._send, requests, additional_args)
+    
+    def _send(self, requests, additional_args):
+        try:
+            responses = self.gpt.text_only_batch_call([content for content, _ in requests], additional_args)
+        except Exception as e:
+            responses = [e] * len(requests)
+        for (_, future), response in zip(requests, responses):
+            if isinstance(response, Exception):
+                future.set_exception(response)
+            else:
+                future.set_result(response)
+    
+    def close(self):
+        """Send anything still queued and stop the collector."""
+        self._queue.put(None)
+        self._collector.join()
+        self._executor.shutdown(wait=True)
+
+# Patterns and phrase tables for extract_final_conclusion, compiled once at import
+_FINAL_CONCLUSION_RES = tuple(re.compile(p, re.IGNORECASE | re.DOTALL) for p in [
+    r"\*\*'?Final Conclusion'?\*\*:?\s*(.*?)(?:\n\n\*\*'?Verification'?\*\*|\*\*'?Verification'?\*\*|$)",
+    r"\*\*'?Final Conclusion'?\*\*\s*(.*?)(?:\n\n\*\*|\*\*(?!'?Final)|$)"
+])
+_TRANSCRIBED_INTRO_RE = re.compile(r'^The transcribed text.*?(?:is|are).*?(?:as )?follows?:\s*\n*(.*)', re.IGNORECASE | re.DOTALL)
+_BOLD_RE = re.compile(r'\*\*([^*]+)\*\*')
+_ITALIC_RE = re.compile(r'\*([^*]+)\*')
+_VISUAL_PRESENTATION_RE = re.compile(r'\n\*\*Visual Presentation.*$', re.DOTALL)
+_OCR_CONCLUSION_RES = tuple(re.compile(p, re.IGNORECASE | re.DOTALL) for p in [
+    # "Here's the transcribed text:" followed by the actual content
+    r"(?:here's the transcribed text|here is the transcribed text):\s*\n*(.*?)(?:\n\n\*\*|$)",
+    # "The text reads:" or similar
+    r"(?:the (?:handwritten )?text (?:in the image )?(?:reads?|says?|is)):\s*\n*(.*?)(?:\n\n\*\*|$)",
+    # "Transcription:" or "Transcribed text:"
+    r"(?:transcription|transcribed text|extracted text|final transcription):\s*\n*(.*?)(?:\n\n\*\*|$)",
+    # Content after "**Transcription:**" headers
+    r"\*\*transcription\*\*:\s*\n*(.*?)(?:\n\n\*\*|$)",
+    # Direct handwritten content patterns
+    r"(?:handwritten text|visible text|text content):\s*\n*(.*?)(?:\n\n\*\*|$)",
+    r"(?:final conclusion|in conclusion|therefore|thus|to conclude|in summary):\s*(.*?)(?:\n\n|\Z)",
+    r"(?:the answer is|my answer is|i conclude that):\s*(.*?)(?:\n\n|\Z)",
+    r"(?::diagnosis is|diagnosis:|final diagnosis:):\s*(.*?)(?:\n\n|\Z)"
+])
+_LONG_QUOTE_RE = re.compile(r'"([^"]{20,})"', re.DOTALL)  # Long quoted content (likely the transcription)
+_OCR_META_PHRASES = (
+    'the text is', 'visual presentation', 'handwriting', 'organized', 
+    'here\'s the', 'the image contains', 'transcribed text', 'transcription:',
+    'extracted text', 'final transcription', 'the answer is', 'my answer is',
+    'i conclude that', 'diagnosis is', 'final diagnosis', 'findings:',
+)
+_MEDICAL_CONCLUSION_RES = tuple(re.compile(p, re.IGNORECASE | re.DOTALL) for p in [
+    r"(?:final diagnosis|diagnosis:|findings?:|conclusion:)\s*(.*?)(?:\n\n|\Z)",
+    r"(?:the patient.*?has|consistent with|diagnosis.*?is)\s+(.*?)(?:\.|$)",
+    r"(?:therefore|thus|in conclusion),?\s*(.*?)(?:\n\n|\Z)"
+])
+_GENERAL_CONCLUSION_RES = tuple(re.compile(p, re.IGNORECASE | re.DOTALL) for p in [
+    r"(?:final conclusion|in conclusion|therefore|thus|to conclude|in summary):\s*(.*?)(?:\n\n|\Z)",
+    r"(?:the answer is|my answer is|i conclude that):\s*(.*?)(?:\n\n|\Z)",
+    r"(?:so|therefore|thus),?\s+(.+?)(?:\.|$)"
+])
+_QUOTE_RE = re.compile(r'"([^"]+)"')
+_REASONING_META_PHRASES = (
+    'inner thinking', 'verification', 'let me', 'okay', 'now', 
+    'wait', 'hmm', 'alright', 'putting it all together'
+)
+
 def extract_final_conclusion(text, content_type="general"):
     """Extract what appears to be a final conclusion or answer from text."""
-    import re
-    
     if not text or not text.strip():
         return ""
     
@@ -175,74 +564,48 @@ def extract_final_conclusion(text, content_type="general"):
     
     # Handle structured reasoning format (like handwriting OCR)
     if "**'Final Conclusion'**" in text or "**Final Conclusion**" in text:
-        conclusion_patterns = [
-            r"\*\*'?Final Conclusion'?\*\*:?\s*(.*?)(?:\n\n\*\*'?Verification'?\*\*|\*\*'?Verification'?\*\*|$)",
-            r"\*\*'?Final Conclusion'?\*\*\s*(.*?)(?:\n\n\*\*|\*\*(?!'?Final)|$)"
-        ]
-        
-        for pattern in conclusion_patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+        for pattern in _FINAL_CONCLUSION_RES:
+            match = pattern.search(text)
             if match:
                 result = match.group(1).strip()
                 
                 # For OCR content, handle the "transcribed text follows" pattern
                 if content_type.lower() == "ocr":
                     # Check if it starts with introductory text
-                    intro_match = re.match(r'^The transcribed text.*?(?:is|are).*?(?:as )?follows?:\s*\n*(.*)', result, re.IGNORECASE | re.DOTALL)
+                    intro_match = _TRANSCRIBED_INTRO_RE.match(result)
                     if intro_match:
                         actual_content = intro_match.group(1).strip()
                         if actual_content:
                             return actual_content
                 
                 # Clean up formatting
-                result = re.sub(r'\*\*([^*]+)\*\*', r'\1', result)
-                result = re.sub(r'\*([^*]+)\*', r'\1', result)
+                result = _BOLD_RE.sub(r'\1', result)
+                result = _ITALIC_RE.sub(r'\1', result)
                 if result and len(result) > 10:
                     return result
     
     # Handle OCR-specific patterns
     if content_type == "ocr":
         # First try to find explicit transcription sections
-        ocr_patterns = [
-            # "Here's the transcribed text:" followed by the actual content
-            r"(?:here's the transcribed text|here is the transcribed text):\s*\n*(.*?)(?:\n\n\*\*|$)",
-            # "The text reads:" or similar
-            r"(?:the (?:handwritten )?text (?:in the image )?(?:reads?|says?|is)):\s*\n*(.*?)(?:\n\n\*\*|$)",
-            # "Transcription:" or "Transcribed text:"
-            r"(?:transcription|transcribed text|extracted text|final transcription):\s*\n*(.*?)(?:\n\n\*\*|$)",
-            # Content after "**Transcription:**" headers
-            r"\*\*transcription\*\*:\s*\n*(.*?)(?:\n\n\*\*|$)",
-            # Direct handwritten content patterns
-            r"(?:handwritten text|visible text|text content):\s*\n*(.*?)(?:\n\n\*\*|$)",
-            r"(?:final conclusion|in conclusion|therefore|thus|to conclude|in summary):\s*(.*?)(?:\n\n|\Z)",
-            r"(?:the answer is|my answer is|i conclude that):\s*(.*?)(?:\n\n|\Z)",
-            r"(?::diagnosis is|diagnosis:|final diagnosis:):\s*(.*?)(?:\n\n|\Z)"        ]
-
-        for pattern in ocr_patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+        for pattern in _OCR_CONCLUSION_RES:
+            match = pattern.search(text)
             if match:
                 result = match.group(1).strip()
                 # Clean up any residual formatting
-                result = re.sub(r'\*\*([^*]+)\*\*', r'\1', result)
-                result = re.sub(r'\*([^*]+)\*', r'\1', result)
+                result = _BOLD_RE.sub(r'\1', result)
+                result = _ITALIC_RE.sub(r'\1', result)
                 # Remove visual presentation sections
-                result = re.sub(r'\n\*\*Visual Presentation.*$', '', result, flags=re.DOTALL)
+                result = _VISUAL_PRESENTATION_RE.sub('', result)
                 if result and len(result) > 10:
                     return result
         
         # For handwriting OCR, look for quoted content which often contains the actual transcription
-        quote_patterns = [
-            r'"([^"]{20,})"',  # Long quoted content (likely the transcription)
-            r'\"([^\"]{20,})\"'  # Alternative quote style
-        ]
-        
-        for pattern in quote_patterns:
-            matches = re.findall(pattern, text, re.DOTALL)
-            if matches:
-                # Return the longest quoted content (most likely the full transcription)
-                longest_quote = max(matches, key=len)
-                if len(longest_quote) > 20:
-                    return longest_quote.strip()
+        matches = _LONG_QUOTE_RE.findall(text)
+        if matches:
+            # Return the longest quoted content (most likely the full transcription)
+            longest_quote = max(matches, key=len)
+            if len(longest_quote) > 20:
+                return longest_quote.strip()
         
         # Look for content that starts with capital letters and looks like transcribed text
         # This catches cases where the transcription isn't explicitly labeled
@@ -258,19 +621,15 @@ def extract_final_conclusion(text, content_type="general"):
                 continue
                 
             # Skip meta-commentary lines
-            if any(skip_phrase in line.lower() for skip_phrase in [
-                'the text is', 'visual presentation', 'handwriting', 'organized', 
-                'here\'s the', 'the image contains', 'transcribed text', 'transcription:',
-                'extracted text', 'final transcription', 'the answer is', 'my answer is',
-                'i conclude that', 'diagnosis is', 'final diagnosis', 'findings:',
-            ]):
+            lower_line = line.lower()
+            if any(skip_phrase in lower_line for skip_phrase in _OCR_META_PHRASES):
                 if not collecting:
                     continue
                 else:
                     break  # End of transcription
                     
             # Start collecting if we find content that looks like transcribed text
-            if re.match(r'^[A-Z]', line) and len(line) > 10:
+            if line[0].isascii() and line[0].isupper() and len(line) > 10:
                 collecting = True
                 potential_transcription.append(line)
             elif collecting:
@@ -283,36 +642,23 @@ def extract_final_conclusion(text, content_type="general"):
     
     # Handle medical/diagnostic patterns
     if content_type == "medical":
-        medical_patterns = [
-            r"(?:final diagnosis|diagnosis:|findings?:|conclusion:)\s*(.*?)(?:\n\n|\Z)",
-            r"(?:the patient.*?has|consistent with|diagnosis.*?is)\s+(.*?)(?:\.|$)",
-            r"(?:therefore|thus|in conclusion),?\s*(.*?)(?:\n\n|\Z)"
-        ]
-        
-        for pattern in medical_patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+        for pattern in _MEDICAL_CONCLUSION_RES:
+            match = pattern.search(text)
             if match:
                 result = match.group(1).strip()
                 if result and len(result) > 10:
                     return result
     
     # General conclusion indicators
-    general_patterns = [
-        r"(?:final conclusion|in conclusion|therefore|thus|to conclude|in summary):\s*(.*?)(?:\n\n|\Z)",
-        r"(?:the answer is|my answer is|i conclude that):\s*(.*?)(?:\n\n|\Z)",
-        r"(?:so|therefore|thus),?\s+(.+?)(?:\.|$)"
-    ]
-    
-    for pattern in general_patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+    for pattern in _GENERAL_CONCLUSION_RES:
+        match = pattern.search(text)
         if match:
             result = match.group(1).strip()
             if result and len(result) > 10:
                 return result
     
     # Look for quoted content (common in structured responses)
-    quote_pattern = r'"([^"]+)"'
-    quotes = re.findall(quote_pattern, text)
+    quotes = _QUOTE_RE.findall(text)
     if quotes:
         longest_quote = max(quotes, key=len)
         if len(longest_quote) > 20:
@@ -326,10 +672,7 @@ def extract_final_conclusion(text, content_type="general"):
         for p in paragraphs:
             lower_p = p.lower()
             # Skip reasoning metadata
-            if not any(meta in lower_p for meta in [
-                'inner thinking', 'verification', 'let me', 'okay', 'now', 
-                'wait', 'hmm', 'alright', 'putting it all together'
-            ]):
+            if not any(meta in lower_p for meta in _REASONING_META_PHRASES):
                 content_paragraphs.append(p)
         
         if content_paragraphs:
@@ -342,6 +685,41 @@ def extract_final_conclusion(text, content_type="general"):
     # Ultimate fallback
     return text[-200:].strip() if len(text) > 200 else text
 
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+_CHOICE_RE = re.compile(r"^[A-D]$")
+
+def _norm(text):
+    """Lowercase, strip punctuation and collapse whitespace for direct comparison."""
+    return _WHITESPACE_RE.sub(" ", _PUNCT_RE.sub(" ", str(text).lower())).strip()
+
+def _as_float(text):
+    try:
+        return float(str(text).strip().replace(",", ""))
+    except ValueError:
+        return None
+
+def _cheap_verify(response, reference):
+    """
+    Rule-based verdict for trivially comparable answers.
+    Returns True/False when the answer can be decided without the LLM, otherwise None.
+    """
+    if not response or not reference:
+        return None
+    
+    if _norm(response) == _norm(reference):
+        return True
+    
+    response_num, reference_num = _as_float(response), _as_float(reference)
+    if response_num is not None and reference_num is not None:
+        return math.isclose(response_num, reference_num, rel_tol=1e-3)
+    
+    choice = str(reference).strip()
+    if _CHOICE_RE.match(choice) and _norm(response).split()[-1:] == [choice.lower()]:
+        return True
+    
+    return None
+
 def check_answer_accuracy(response, reference, gpt_instance, query_history=None, response_history=None, content_type="general"):
     """
     Comprehensive answer accuracy checking that strictly validates against ground truth.
@@ -355,9 +733,14 @@ def check_answer_accuracy(response, reference, gpt_instance, query_history=None,
     # Extract the actual content to compare
     extracted_response = extract_final_conclusion(response, content_type)
     
+    # Skip the LLM when exact/numeric/multiple-choice matching already decides it
+    cheap_verdict = _cheap_verify(extracted_response, reference)
+    if cheap_verdict is not None:
+        print(f"verification (rule-based): {cheap_verdict}")
+        return cheap_verdict
+    
     # Use the verify_prompt from the config (handwriting_prompts.yaml or salesforce_prompts.yaml)
-    verify_prompt_template = gpt_instance.config.prompts.get('verify_prompt', 
-        '<Model Response>\n{}\n</Model Response>\n\n<Reference Answer>\n{}\n</Reference Answer>\n\nBased on the model response and reference answer above, is the model\'s conclusion correct?\nSimply answer "True" if correct, "False" if incorrect dont add anything else.')
+    verify_prompt_template = gpt_instance.config.prompt_bundle.verify
     
     # Format the verification query
     query = verify_prompt_template.format(extracted_response, reference)
@@ -390,13 +773,18 @@ class ReasoningStrategies:
     
     def _load_strategies(self):
         """Load search strategies from prompts."""
-        prompts = self.config.prompts
-        return [
-            ('Backtracking', prompts.get('gen_prompt_rethink_Backtracking', '')),
-            ('Exploring New Paths', prompts.get('gen_prompt_rethink_Exploring_New_Path', '')),
-            ('Verification', prompts.get('gen_prompt_rethink_Verification', '')),
-            ('Correction', prompts.get('gen_prompt_rethink_Correction', ''))
-        ]
+        return self.config.prompt_bundle.strategies
+    
+    def _plan_strategy_steps(self, max_search_attempts, max_search_depth):
+        """Lay out the (attempt, depth, name, prompt) sequence the search walks through."""
+        steps = []
+        for search_attempt in range(max_search_attempts):
+            strategy_name, strategy_prompt = self.strategies[search_attempt % len(self.strategies)]
+            if not strategy_prompt:
+                continue
+            for depth in range(max_search_depth):
+                steps.append((search_attempt, depth, strategy_name, strategy_prompt))
+        return steps
     
     def apply_strategy(self, strategy_name, strategy_prompt, current_result, context_data=None):
         """Apply a specific reasoning strategy."""
@@ -472,41 +860,50 @@ class ReasoningStrategies:
             }
         
         # Apply strategies until correct answer found or max attempts reached
-        search_attempts = 0
         max_search_attempts = self.config.config.get('max_search_attempts', 3)
         max_search_depth = self.config.config.get('max_search_depth', 2)
+        steps = self._plan_strategy_steps(max_search_attempts, max_search_depth)
+        content_type = context_data.get('content_type', 'general') if context_data else 'general'
         
-        while not found_correct_answer and search_attempts < max_search_attempts:
-            for depth in range(max_search_depth):
+        # Most verifications fail, so the next strategy call is launched alongside the
+        # verification of the current one and simply discarded if it turns out correct.
+        speculate = self.config.config.get('speculative_strategies', True)
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="strategy") if speculate else None
+        pending = None
+        
+        try:
+            for step_index, (search_attempt, depth, strategy_name, strategy_prompt) in enumerate(steps):
                 if len(strategies_used) >= max_strategies:
                     break
-                    
-                # Select strategy (can be random or sequential)
-                strategy_index = search_attempts % len(self.strategies)
-                strategy_name, strategy_prompt = self.strategies[strategy_index]
-                
-                if not strategy_prompt:
-                    continue
                 
                 try:
-                    # Apply the strategy
-                    improved = self.apply_strategy(strategy_name, strategy_prompt, current_result, context_data)
+                    # Apply the strategy (or collect the speculatively launched call)
+                    if pending is not None:
+                        improved = pending.result()
+                        pending = None
+                    else:
+                        improved = self.apply_strategy(strategy_name, strategy_prompt, current_result, context_data)
                     
                     # Check if strategy returned a valid result
                     if isinstance(improved, dict) and "result" in improved:
                         new_result = improved["result"]
                         if new_result != current_result:
                             current_result = new_result
-                            strategies_used.append(f"Attempt {search_attempts+1}-{depth+1}: {strategy_name}")
+                            strategies_used.append(f"Attempt {search_attempt+1}-{depth+1}: {strategy_name}")
                             reasoning_trace.append(improved["reasoning"])
                             
                             # Check if this strategy found the correct answer
                             if ground_truth and self.gpt:
+                                next_step = step_index + 1
+                                if executor and next_step < len(steps) and len(strategies_used) < max_strategies:
+                                    _, _, next_name, next_prompt = steps[next_step]
+                                    pending = executor.submit(
+                                        self.apply_strategy, next_name, next_prompt, current_result, context_data
+                                    )
                                 try:
                                     found_correct_answer = check_answer_accuracy(
                                         current_result, ground_truth, self.gpt,
-                                        query_history, response_history,
-                                        context_data.get('content_type', 'general') if context_data else 'general'
+                                        query_history, response_history, content_type
                                     )
                                     print(f"Strategy {strategy_name} accuracy: {found_correct_answer}")
                                     
@@ -518,22 +915,22 @@ class ReasoningStrategies:
                         # Handle case where strategy returns just the result (backward compatibility)
                         if improved != current_result:
                             current_result = improved
-                            strategies_used.append(f"Attempt {search_attempts+1}-{depth+1}: {strategy_name}")
+                            strategies_used.append(f"Attempt {search_attempt+1}-{depth+1}: {strategy_name}")
                             reasoning_trace.append(improved)
                     
                 except Exception as e:
                     print(f"Error applying strategy {strategy_name}: {e}")
                     strategies_used.append(f"Failed: {strategy_name}")
-                    
-            search_attempts += 1
-            if found_correct_answer:
-                break
+        finally:
+            if executor:
+                # Don't wait on a speculative call whose result is no longer needed
+                executor.shutdown(wait=False, cancel_futures=True)
         
         # If still not correct and efficient search is enabled, try guided approach
         efficient_search = self.config.config.get('efficient_search', True)
         if not found_correct_answer and efficient_search and ground_truth and self.gpt:
             try:
-                guided_prompt = self.config.prompts.get('guided_prompt', '')
+                guided_prompt = self.config.prompt_bundle.guided
                 if guided_prompt and context_data:
                     question = context_data.get('question', '')
                     guided_query = guided_prompt.format(question, current_result, ground_truth)
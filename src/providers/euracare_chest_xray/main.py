@@ -2,18 +2,24 @@ import os
 import sys
 import argparse
 import yaml
+from functools import lru_cache
 from pathlib import Path
 from tqdm import tqdm
 sys.path.append('/home/justjosh/Turing-Test')
 from dotenv import load_dotenv
 from .report_processor import ReportProcessor
 
-def load_settings(settings_path="moremi_reasoning/src/settings.yaml"):
-    """Load settings from YAML file."""
+@lru_cache(maxsize=4)
+def _load_settings_cached(settings_path, mtime):
+    """Parse the settings YAML; cached per (path, mtime) so edits are picked up."""
     with open(settings_path, 'r') as f:
         return yaml.safe_load(f)
 
-def process_reports(modality="chest_xray", num_reports=None, patient_ids=None, settings_path=None):
+def load_settings(settings_path="moremi_reasoning/src/settings.yaml"):
+    """Load settings from YAML file."""
+    return _load_settings_cached(settings_path, os.path.getmtime(settings_path))
+
+def process_reports(modality="chest_xray", num_reports=None, patient_ids=None, settings_path=None, concurrency=8, batch_size=1):
     """
     Process reports using the Gemini API
     
@@ -22,6 +28,8 @@ def process_reports(modality="chest_xray", num_reports=None, patient_ids=None, s
         num_reports (int, optional): Number of reports to process. If None, process all.
         patient_ids (list, optional): List of specific patient IDs to process. If provided, num_reports is ignored.
         settings_path (str, optional): Path to settings file
+        concurrency (int): Number of records to process in parallel
+        batch_size (int): Number of records to send per API request
     """
     # Load environment variables
     load_dotenv()
@@ -62,16 +70,20 @@ def process_reports(modality="chest_xray", num_reports=None, patient_ids=None, s
         settings=settings
     )
     
-    # Process reports according to the specified filters
-    if patient_ids:
-        # Process only specific patient IDs
-        processor.process_specific_patients(patient_ids)
-    else:
-        # Process all or limited number of reports
-        processor.process_reports(num_reports=num_reports)
-    
-    # Always save the consolidated file at the end
-    processor.save_consolidated_records()
+    try:
+        # Process reports according to the specified filters
+        if patient_ids:
+            # Process only specific patient IDs
+            processor.process_specific_patients(patient_ids)
+        else:
+            # Process all or limited number of reports
+            processor.process_reports(num_reports=num_reports, max_workers=concurrency, batch_size=batch_size)
+        
+        # Always save the consolidated file at the end
+        processor.save_consolidated_records()
+    finally:
+        # Close the archive and results log and drain queued log records even on failure
+        processor.close()
     print(f"Consolidated file saved in reports/{modality}/ directory")
 
 if __name__ == "__main__":
@@ -81,6 +93,8 @@ if __name__ == "__main__":
     parser.add_argument('--patients', nargs='+', help='Specific patient IDs to process')
     parser.add_argument('--force', action='store_true', help='Force reprocessing of already processed records')
     parser.add_argument('--settings', help='Path to settings file (default: moremi_reasoning/src/settings.yaml)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of records to process in parallel')
+    parser.add_argument('--batch-size', type=int, default=1, help='Number of records to send per API request')
     
     args = parser.parse_args()
     
@@ -88,5 +102,7 @@ if __name__ == "__main__":
         modality=args.modality,
         num_reports=args.num, 
         patient_ids=args.patients,
-        settings_path=args.settings
+        settings_path=args.settings,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size
     )
\ No newline at end of file
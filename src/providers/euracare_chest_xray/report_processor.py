@@ -1,13 +1,72 @@
 import os
 import json
+import fnmatch
+import zipfile
 import base64
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+import time
+import queue
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from tqdm import tqdm
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Union
-from tenacity import retry, stop_after_attempt, wait_exponential
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, List, Any, Optional, Tuple, Union
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+# Appended to batched requests so the answers can be split back per record
+BATCH_INSTRUCTION = (
+    "The images above belong to different patients, each introduced by its Patient ID. "
+    "Return a JSON array with one object per patient, in the same format you would use for a "
+    "single patient, and include a \"patient_id\" field in each object."
+)
+
+FILES_UPLOAD_URL = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class APIError(Exception):
+    """Non-retryable error returned by the Gemini API."""
+
+class RetryableAPIError(APIError):
+    """Transient API failure (rate limit, 5xx, network) worth retrying."""
+
+api_retry = retry(
+    stop=stop_after_attempt(5),
+    wait=wait_exponential(multiplier=2, min=2, max=120),
+    retry=retry_if_exception_type(RetryableAPIError)
+)
+
+def _retry_after_seconds(response: requests.Response, default: int = 10) -> int:
+    """Read the Retry-After header (seconds form), falling back to a default."""
+    try:
+        return int(response.headers.get("Retry-After", default))
+    except ValueError:
+        return default
+
+def _format_context(record: Dict[str, Any]) -> str:
+    """Serialize a record for the prompt; compact separators skip the slow indent encoder."""
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Read size for base64 encoding; a multiple of 3 so no padding is emitted mid-stream
+_ENCODE_CHUNK_SIZE = 3 * 65536
+
+@lru_cache(maxsize=16)
+def _encode_file_base64(image_path: str, mtime: float) -> str:
+    """Base64-encode a file chunk by chunk; cached per (path, mtime) so retries don't re-encode."""
+    encoded = bytearray()
+    with open(image_path, "rb", buffering=1 << 20) as image_file:
+        while chunk := image_file.read(_ENCODE_CHUNK_SIZE):
+            encoded += base64.b64encode(chunk)
+    return encoded.decode("ascii")
 
 class ReportProcessor:
     """Process medical reports for various modalities using the Gemini API."""
@@ -39,6 +98,23 @@ class ReportProcessor:
         # Set up API endpoint
         self.api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro-vision:generateContent"
         
+        # Optionally upload images once via the Files API and reference them by URI
+        self.use_files_api = self.settings.get("use_files_api", False)
+        self._file_uri_cache: Dict[Tuple[str, float], str] = {}
+        
+        # Reuse one keep-alive connection pool for all API calls
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "x-goog-api-key": self.api_key
+        })
+        
+        # Index the image directory once instead of probing it per record
+        self._image_index = self._build_image_index()
+        self._image_stems = list(self._image_index)
+        self._gt_index = self._build_ground_truth_index()
+        
         # Set up output directory
         self.output_dir = Path(f"reports/{modality}")
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -47,14 +123,39 @@ class ReportProcessor:
         self._setup_logging()
         
         # Load processed records
+        self._records_lock = threading.Lock()
         self.consolidated_file = self.output_dir / f"{modality}_reasoning_consolidated.json"
+        self.jsonl_path = self.output_dir / f"{modality}_reasoning.jsonl"
+        migrate_legacy = not self.jsonl_path.exists()
+        self._log_needs_newline = False
         self.processed_records = self._load_processed_records()
         
+        # The JSONL log is the source of truth for progress; results are appended as they
+        # complete and the consolidated file is only materialized at the end of a run
+        self.jsonl_file = open(self.jsonl_path, "ab", buffering=0)
+        if self._log_needs_newline:
+            # Terminate a line truncated by an interrupted run before appending after it
+            self.jsonl_file.write(b"\n")
+        if migrate_legacy:
+            for patient_id, result in self.processed_records.items():
+                self._append_to_log(patient_id, result)
+        
+        # Individual results go into one archive instead of one small file per record
+        self.archive_path = self.output_dir / f"{modality}_results.zip"
+        self._archive = self._open_archive()
+        
         # Get modality template
         self.template = self._get_modality_template()
+        # Sent as the system instruction so every request shares an identical, cacheable prefix
+        self._system_instruction = {"parts": [{"text": self.template}]} if self.template else None
         
         # Initialize records list
         self.records = self._load_records()
+        self._records_by_id = {
+            (r.get("patient_id") or r.get("case_id")): r
+            for r in self.records
+            if r.get("patient_id") or r.get("case_id")
+        }
         
         self.logger.info(f"Initialized ReportProcessor for {modality}")
         self.logger.info(f"Found {len(self.records)} total records")
@@ -76,8 +177,43 @@ class ReportProcessor:
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         file_handler.setFormatter(formatter)
         
-        # Add handlers
-        self.logger.addHandler(file_handler)
+        # Worker threads only enqueue records; a background listener does the file writes
+        log_queue = queue.Queue(-1)
+        self.logger.addHandler(QueueHandler(log_queue))
+        self.logger.propagate = False
+        self._log_listener = QueueListener(log_queue, file_handler)
+        self._log_listener.start()
+    
+    def _archive_entry_name(self, patient_id: str) -> str:
+        return f"{patient_id}_{self.modality}_reasoning.json"
+    
+    def _open_archive(self) -> zipfile.ZipFile:
+        """Open the per-record results archive for appending, rebuilding it if damaged."""
+        self._archived_names = set()
+        damaged = False
+        if self.archive_path.exists() and self.archive_path.stat().st_size:
+            # A run killed before close() leaves a stale or missing central directory.
+            # Mode "a" would silently start a new archive after the damaged bytes, so
+            # open it for reading first
+            try:
+                with zipfile.ZipFile(self.archive_path) as archive:
+                    self._archived_names = set(archive.namelist())
+            except zipfile.BadZipFile:
+                damaged = True
+        
+        if not damaged:
+            return zipfile.ZipFile(self.archive_path, "a", zipfile.ZIP_DEFLATED, compresslevel=1)
+        
+        # The JSONL log has every result, so set the damaged archive aside and
+        # rewrite it from the processed records
+        damaged_path = self.archive_path.with_suffix(".zip.damaged")
+        self.logger.error(f"Results archive is damaged, moving it to {damaged_path} and rebuilding it")
+        self.archive_path.replace(damaged_path)
+        archive = zipfile.ZipFile(self.archive_path, "w", zipfile.ZIP_DEFLATED, compresslevel=1)
+        for patient_id, result in self.processed_records.items():
+            archive.writestr(self._archive_entry_name(patient_id), json.dumps(result, indent=2))
+        self._archived_names = set(archive.namelist())
+        return archive
     
     def _get_modality_template(self) -> str:
         """Get the template for the current modality."""
@@ -87,16 +223,35 @@ class ReportProcessor:
         return ""
     
     def _load_processed_records(self) -> Dict[str, Any]:
-        """Load previously processed records."""
+        """Load previously processed records from the JSONL log (latest entry wins)."""
+        if not self.jsonl_path.exists():
+            return self._load_legacy_consolidated()
+        
+        processed_records = {}
+        with open(self.jsonl_path, 'rb') as f:
+            for line in f:
+                self._log_needs_newline = not line.endswith(b"\n")
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # A run interrupted mid-write can leave a truncated last line
+                    continue
+                processed_records[entry["patient_id"]] = entry["result"]
+        return processed_records
+    
+    def _load_legacy_consolidated(self) -> Dict[str, Any]:
+        """Load the consolidated file written by runs that predate the JSONL log."""
         if self.consolidated_file.exists():
             try:
-                with open(self.consolidated_file, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
+                return orjson.loads(self.consolidated_file.read_bytes())
+            except orjson.JSONDecodeError:
                 self.logger.error(f"Error loading consolidated file: {self.consolidated_file}")
-                return {}
         return {}
     
+    def _append_to_log(self, patient_id: str, result: Dict[str, Any]):
+        """Append one result to the JSONL progress log."""
+        self.jsonl_file.write(orjson.dumps({"patient_id": patient_id, "result": result}) + b"\n")
+    
     def _load_records(self) -> List[Dict[str, Any]]:
         """Load records to process based on modality."""
         if self.modality == "chest_xray":
@@ -110,24 +265,40 @@ class ReportProcessor:
                 return []
         else:
             # For other modalities - load from individual JSON files in directory
-            records = []
+            def load_patient_file(json_file: Path) -> Optional[Dict[str, Any]]:
+                try:
+                    patient_data = orjson.loads(json_file.read_bytes())
+                except orjson.JSONDecodeError:
+                    self.logger.error(f"Error loading patient file: {json_file}")
+                    return None
+                # Add patient_id based on filename
+                patient_data["patient_id"] = json_file.stem
+                return patient_data
+            
             try:
-                if self.report_file_path.is_dir():
-                    for json_file in self.report_file_path.glob("*.json"):
-                        try:
-                            with open(json_file, 'r') as f:
-                                patient_data = json.load(f)
-                                # Add patient_id based on filename
-                                patient_data["patient_id"] = json_file.stem
-                                records.append(patient_data)
-                        except json.JSONDecodeError:
-                            self.logger.error(f"Error loading patient file: {json_file}")
-                            continue
-                return records
+                if not self.report_file_path.is_dir():
+                    return []
+                # Many small independent files: overlap the reads across threads
+                json_files = list(self.report_file_path.glob("*.json"))
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    return [record for record in executor.map(load_patient_file, json_files) if record is not None]
             except Exception as e:
                 self.logger.error(f"Error loading records for {self.modality}: {e}")
                 return []
     
+    def _build_image_index(self) -> Dict[str, str]:
+        """Map image stems to paths with a single directory scan."""
+        image_index = {}
+        if not self.image_base_path.is_dir():
+            return image_index
+        
+        # Sort so that, for a shared stem, .jpg wins over .jpeg over .png as before
+        priority = {ext: rank for rank, ext in enumerate(IMAGE_EXTENSIONS)}
+        image_files = [p for p in self.image_base_path.iterdir() if p.suffix.lower() in priority]
+        for image_file in sorted(image_files, key=lambda p: priority[p.suffix.lower()]):
+            image_index.setdefault(image_file.stem, str(image_file))
+        return image_index
+    
     def _get_image_path(self, record: Dict[str, Any]) -> Optional[str]:
         """Get image path for a record based on modality."""
         if self.modality == "chest_xray":
@@ -137,17 +308,7 @@ class ReportProcessor:
                 return None
             
             # Standardized image path pattern for chest X-rays
-            image_path = self.image_base_path / f"{case_id}.jpg"
-            if image_path.exists():
-                return str(image_path)
-            
-            # Try alternate formats
-            for ext in [".jpeg", ".png"]:
-                alt_path = self.image_base_path / f"{case_id}{ext}"
-                if alt_path.exists():
-                    return str(alt_path)
-            
-            return None
+            return self._image_index.get(str(case_id))
         else:
             # For other modalities
             patient_id = record.get("patient_id")
@@ -155,22 +316,101 @@ class ReportProcessor:
                 return None
             
             # Check for direct match
-            for ext in [".jpg", ".jpeg", ".png"]:
-                image_path = self.image_base_path / f"{patient_id}{ext}"
-                if image_path.exists():
-                    return str(image_path)
+            image_path = self._image_index.get(patient_id)
+            if image_path:
+                return image_path
             
             # Try fuzzy matching
-            for img_file in self.image_base_path.glob("*.jpg"):
-                if patient_id in img_file.stem:
-                    return str(img_file)
+            for stem in self._image_stems:
+                if patient_id in stem:
+                    return self._image_index[stem]
             
             return None
     
     def _encode_image(self, image_path: str) -> str:
         """Encode image to base64."""
+        return _encode_file_base64(image_path, os.path.getmtime(image_path))
+    
+    def _build_ground_truth_index(self) -> List[Tuple[str, str, List[str]]]:
+        """List every patient directory and its files once, as (dir name, dir path, file names)."""
+        if self.modality == "chest_xray":
+            return []
+        
+        all_matches_dir = Path(self.settings.get("data_paths", {}).get("all_matches_combined", "All_Matches_Combined"))
+        if not all_matches_dir.is_dir():
+            return []
+        
+        index = []
+        with os.scandir(all_matches_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith("Patient-") and entry.is_dir():
+                    with os.scandir(entry.path) as files:
+                        file_names = sorted(f.name for f in files if f.is_file())
+                    index.append((entry.name, entry.path, file_names))
+        return index
+    
+    def _upload_image(self, image_path: str) -> str:
+        """Upload an image to the Gemini Files API (once per path/mtime) and return its URI."""
+        cache_key = (image_path, os.path.getmtime(image_path))
+        file_uri = self._file_uri_cache.get(cache_key)
+        if file_uri:
+            return file_uri
+        
         with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode("utf-8")
+            image_bytes = image_file.read()
+        
+        try:
+            # Resumable upload: start the session, then send the bytes and finalize
+            start = self.session.post(
+                FILES_UPLOAD_URL,
+                params={"key": self.api_key},
+                headers={
+                    "X-Goog-Upload-Protocol": "resumable",
+                    "X-Goog-Upload-Command": "start",
+                    "X-Goog-Upload-Header-Content-Length": str(len(image_bytes)),
+                    "X-Goog-Upload-Header-Content-Type": "image/jpeg"
+                },
+                json={"file": {"display_name": os.path.basename(image_path)}},
+                timeout=(5, 60)
+            )
+            start.raise_for_status()
+            upload = self.session.post(
+                start.headers["X-Goog-Upload-URL"],
+                headers={
+                    "Content-Type": "image/jpeg",
+                    "X-Goog-Upload-Offset": "0",
+                    "X-Goog-Upload-Command": "upload, finalize"
+                },
+                data=image_bytes,
+                timeout=(5, 120)
+            )
+            upload.raise_for_status()
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableAPIError(f"Image upload failed: {e}") from e
+        except requests.HTTPError as e:
+            if e.response.status_code in RETRYABLE_STATUS_CODES:
+                raise RetryableAPIError(f"Image upload failed: {e}") from e
+            raise APIError(f"Image upload failed: {e}") from e
+        
+        file_uri = upload.json()["file"]["uri"]
+        self._file_uri_cache[cache_key] = file_uri
+        return file_uri
+    
+    def _image_part(self, image_path: str) -> Dict[str, Any]:
+        """Build the request part for an image, by Files API reference or inline base64."""
+        if self.use_files_api:
+            return {
+                "fileData": {
+                    "mimeType": "image/jpeg",
+                    "fileUri": self._upload_image(image_path)
+                }
+            }
+        return {
+            "inlineData": {
+                "mimeType": "image/jpeg",
+                "data": self._encode_image(image_path)
+            }
+        }
     
     def _find_ground_truth(self, patient_id: str) -> Optional[Dict[str, str]]:
         """Find ground truth data based on modality."""
@@ -178,57 +418,24 @@ class ReportProcessor:
             # No special handling for chest X-rays
             return None
         else:
-            # For other modalities, look in All_Matches_Combined directory
-            all_matches_dir = Path(self.settings.get("data_paths", {}).get("all_matches_combined", "All_Matches_Combined"))
-            
-            # Look for patient directory
-            for patient_dir in all_matches_dir.glob(f"Patient-{patient_id}*"):
-                if patient_dir.is_dir():
+            # For other modalities, look in the pre-scanned All_Matches_Combined directory
+            dir_prefix = f"Patient-{patient_id}"
+            for dir_name, dir_path, file_names in self._gt_index:
+                if dir_name.startswith(dir_prefix):
                     # Find docx and image files
-                    docx_files = list(patient_dir.glob("*.doc*"))
-                    image_files = list(patient_dir.glob(f"*{patient_id}*_collage.jpg"))
+                    docx_files = fnmatch.filter(file_names, "*.doc*")
+                    image_files = fnmatch.filter(file_names, f"*{patient_id}*_collage.jpg")
                     
                     if docx_files and image_files:
                         return {
-                            "docx_path": str(docx_files[0]),
-                            "image_path": str(image_files[0])
+                            "docx_path": os.path.join(dir_path, docx_files[0]),
+                            "image_path": os.path.join(dir_path, image_files[0])
                         }
             
             return None
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=60))
-    def _call_gemini_api(self, image_path: str, record: Dict[str, Any]) -> Dict[str, Any]:
-        """Call Gemini API to generate reasoning for an image."""
-        # Encode image
-        encoded_image = self._encode_image(image_path)
-        
-        # Prepare request payload
-        headers = {
-            "Content-Type": "application/json",
-            "x-goog-api-key": self.api_key
-        }
-        
-        # Check for existing ground truth
-        patient_id = record.get("patient_id") or record.get("case_id")
-        ground_truth = self._find_ground_truth(patient_id) if patient_id else None
-        
-        # Prepare content parts
-        content_parts = [
-            {
-                "text": self.template
-            },
-            {
-                "inlineData": {
-                    "mimeType": "image/jpeg",
-                    "data": encoded_image
-                }
-            }
-        ]
-        
-        # Add context from record
-        context = json.dumps(record, indent=2)
-        content_parts.append({"text": f"Patient Context: {context}"})
-        
+    def _generate_content(self, content_parts: List[Dict[str, Any]]) -> str:
+        """Send one generateContent request and return the text of the first candidate."""
         # Prepare request data
         request_data = {
             "contents": [
@@ -244,25 +451,52 @@ class ReportProcessor:
                 "maxOutputTokens": 8192
             }
         }
+        if self._system_instruction:
+            request_data["systemInstruction"] = self._system_instruction
         
         # Make API request
-        response = requests.post(
-            f"{self.api_url}?key={self.api_key}",
-            headers=headers,
-            json=request_data
-        )
+        try:
+            response = self.session.post(
+                self.api_url,
+                params={"key": self.api_key},
+                json=request_data,
+                timeout=(5, 120)
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableAPIError(f"API request failed: {e}") from e
         
         # Check response
         if response.status_code != 200:
             error_message = f"API error: {response.status_code} - {response.text}"
             self.logger.error(error_message)
-            raise Exception(error_message)
+            if response.status_code == 429:
+                # Honour the server's back-off hint before handing over to the retry policy
+                time.sleep(_retry_after_seconds(response))
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                raise RetryableAPIError(error_message)
+            raise APIError(error_message)
         
         # Parse response
         response_data = response.json()
         
         # Extract text response
-        text_response = response_data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+        return response_data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+    
+    @api_retry
+    def _call_gemini_api(self, image_path: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Call Gemini API to generate reasoning for an image."""
+        # Check for existing ground truth
+        patient_id = record.get("patient_id") or record.get("case_id")
+        ground_truth = self._find_ground_truth(patient_id) if patient_id else None
+        
+        # Prepare content parts
+        content_parts = [self._image_part(image_path)]
+        
+        # Add context from record
+        context = _format_context(record)
+        content_parts.append({"text": f"Patient Context: {context}"})
+        
+        text_response = self._generate_content(content_parts)
         
         try:
             # Extract JSON from text
@@ -291,6 +525,48 @@ class ReportProcessor:
                 "ground_truth": ground_truth["docx_path"] if ground_truth else ""
             }
     
+    @api_retry
+    def _call_gemini_api_batch(self, items: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Generate reasoning for several (image_path, record) pairs in a single request.
+        
+        Returns a dict of reasoning data keyed by str(patient ID); records the model
+        left out of its answer are simply missing from the result.
+        """
+        content_parts = []
+        for image_path, record in items:
+            patient_id = record.get("patient_id") or record.get("case_id")
+            content_parts.append({"text": f"Patient ID: {patient_id}"})
+            content_parts.append(self._image_part(image_path))
+            content_parts.append({"text": f"Patient Context: {_format_context(record)}"})
+        content_parts.append({"text": BATCH_INSTRUCTION})
+        
+        text_response = self._generate_content(content_parts)
+        
+        try:
+            start_idx = text_response.find("[")
+            end_idx = text_response.rfind("]")
+            if start_idx == -1 or end_idx == -1:
+                raise ValueError("No JSON array found in response")
+            reasoning_data_list = json.loads(text_response[start_idx:end_idx+1])
+        except (json.JSONDecodeError, ValueError) as e:
+            self.logger.error(f"Error parsing batch API response: {e}")
+            return {}
+        
+        image_paths = {str(record.get("patient_id") or record.get("case_id")): image_path for image_path, record in items}
+        results = {}
+        for reasoning_data in reasoning_data_list:
+            if not isinstance(reasoning_data, dict):
+                continue
+            patient_id = str(reasoning_data.pop("patient_id", ""))
+            if patient_id not in image_paths:
+                continue
+            ground_truth = self._find_ground_truth(patient_id)
+            reasoning_data["img_url"] = image_paths[patient_id]
+            reasoning_data["ground_truth"] = ground_truth["docx_path"] if ground_truth else ""
+            results[patient_id] = reasoning_data
+        return results
+    
     def process_record(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Process a single record."""
         # Extract patient or case ID
@@ -314,45 +590,110 @@ class ReportProcessor:
             # Call Gemini API
             self.logger.info(f"Processing record: {patient_id}")
             result = self._call_gemini_api(image_path, record)
-            
-            # Save individual result
-            output_file = self.output_dir / f"{patient_id}_{self.modality}_reasoning.json"
-            with open(output_file, "w") as f:
-                json.dump(result, f, indent=2)
-            
-            # Update processed records
-            self.processed_records[patient_id] = result
-            
+            self._save_result(patient_id, result)
             return result
         except Exception as e:
             self.logger.error(f"Error processing record {patient_id}: {e}")
             return None
     
-    def process_reports(self, num_reports: Optional[int] = None):
-        """Process all or a limited number of reports."""
-        # Limit records if specified
-        records_to_process = self.records
+    def _save_result(self, patient_id: str, result: Dict[str, Any]):
+        """Add an individual result to the archive and record it as processed."""
+        with self._records_lock:
+            # Appending never replaces an entry, so an ID is archived only once
+            entry_name = self._archive_entry_name(patient_id)
+            if entry_name not in self._archived_names:
+                self._archive.writestr(entry_name, json.dumps(result, indent=2))
+                self._archived_names.add(entry_name)
+            
+            # Update processed records
+            self.processed_records[patient_id] = result
+            self._append_to_log(patient_id, result)
+    
+    def process_batch(self, records: List[Dict[str, Any]]):
+        """Process several records with one API request, falling back to single calls."""
+        items = []
+        for record in records:
+            patient_id = record.get("patient_id") or record.get("case_id")
+            if not patient_id or patient_id in self.processed_records:
+                continue
+            image_path = self._get_image_path(record)
+            if not image_path:
+                self.logger.error(f"Image not found for record: {patient_id}")
+                continue
+            items.append((image_path, record))
+        
+        if not items:
+            return
+        
+        try:
+            self.logger.info(f"Processing batch of {len(items)} records")
+            results = self._call_gemini_api_batch(items)
+        except Exception as e:
+            self.logger.error(f"Error processing batch: {e}")
+            results = {}
+        
+        for image_path, record in items:
+            patient_id = record.get("patient_id") or record.get("case_id")
+            if str(patient_id) in results:
+                self._save_result(patient_id, results[str(patient_id)])
+            else:
+                # Missing from the batch answer - retry on its own
+                self.process_record(record)
+    
+    def _pending_records(self) -> List[Dict[str, Any]]:
+        """Records that have not been processed yet."""
+        return [r for r in self.records if (r.get("patient_id") or r.get("case_id")) not in self.processed_records]
+    
+    def process_reports(self, num_reports: Optional[int] = None, max_workers: int = 8, batch_size: int = 1):
+        """
+        Process all or a limited number of not-yet-processed reports concurrently.
+        
+        With batch_size > 1, records are grouped so that each API request carries
+        several images, amortizing the per-request overhead.
+        """
+        # Skip already processed records up front, then limit to num_reports new ones
+        records_to_process = self._pending_records()
         if num_reports is not None:
             records_to_process = records_to_process[:num_reports]
         
-        # Process records
-        for record in tqdm(records_to_process, desc=f"Processing {self.modality} records"):
-            self.process_record(record)
-            # Save after each record to maintain progress
-            self.save_consolidated_records()
+        if batch_size > 1:
+            records_iter = iter(records_to_process)
+            tasks = [(self.process_batch, batch) for batch in iter(lambda: list(islice(records_iter, batch_size)), [])]
+        else:
+            tasks = [(self.process_record, record) for record in records_to_process]
+        
+        # Process records; each one is dominated by a blocking API call
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(func, arg): arg for func, arg in tasks}
+            for future in tqdm(as_completed(futures), total=len(futures), desc=f"Processing {self.modality} records"):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.logger.error(f"Error processing task: {e}")
     
     def process_specific_patients(self, patient_ids: List[str]):
         """Process specific patients by ID."""
-        for record in self.records:
-            patient_id = record.get("patient_id") or record.get("case_id")
-            if patient_id in patient_ids:
+        for patient_id in dict.fromkeys(patient_ids):
+            record = self._records_by_id.get(patient_id)
+            if record is not None:
                 self.process_record(record)
-                # Save after each record to maintain progress
-                self.save_consolidated_records()
     
     def save_consolidated_records(self):
-        """Save all processed records to a consolidated file."""
-        with open(self.consolidated_file, "w") as f:
-            json.dump(self.processed_records, f, indent=2)
+        """
+        Save all processed records to a consolidated file.
+        
+        Progress is kept durable by the JSONL append log, so this only needs to run
+        at the end of a run.
+        """
+        with self._records_lock:
+            with open(self.consolidated_file, "w") as f:
+                json.dump(self.processed_records, f, indent=2)
         
         self.logger.info(f"Saved {len(self.processed_records)} records to {self.consolidated_file}")
+    
+    def close(self):
+        """Release the pooled HTTP connections, the results log and archive, and flush logging."""
+        self.session.close()
+        self.jsonl_file.close()
+        self._archive.close()
+        self._log_listener.stop()
\ No newline at end of file
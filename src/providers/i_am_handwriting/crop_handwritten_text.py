@@ -15,6 +15,8 @@ import xml.etree.ElementTree as ET
 from pathlib import Path
 import argparse
 import logging
+import multiprocessing
+from tqdm import tqdm
 
 # Set up logging
 logging.basicConfig(
@@ -23,6 +25,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Low zlib level: much cheaper to encode for a small increase in file size
+PNG_COMPRESSION = 1
+
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(
@@ -46,6 +51,12 @@ def parse_args():
         default='data/I AM/cropped_handwritten',
         help='Directory to save cropped images (default: data/I AM/cropped_handwritten)'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of worker processes (default: number of CPUs)'
+    )
     return parser.parse_args()
 
 def get_handwritten_bounds_from_xml(xml_file):
@@ -59,43 +70,51 @@ def get_handwritten_bounds_from_xml(xml_file):
         tuple: (min_x, min_y, max_x, max_y) coordinates for cropping
     """
     try:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        
-        # Get form dimensions
-        form_width = int(root.get('width'))
-        form_height = int(root.get('height'))
-        
-        # Find all handwritten lines
-        handwritten_part = root.find('handwritten-part')
-        if handwritten_part is None:
+        # Stream the document so only the elements we need are materialized;
+        # everything is cleared once its end tag has been seen.
+        form_width = form_height = None
+        in_handwritten_part = found_handwritten_part = False
+        line_count = 0
+        coords = []
+        
+        for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if tag == 'form' and form_width is None:
+                    # Get form dimensions
+                    form_width = int(elem.get('width'))
+                    form_height = int(elem.get('height'))
+                elif tag == 'handwritten-part':
+                    in_handwritten_part = found_handwritten_part = True
+                elif tag == 'line' and in_handwritten_part:
+                    line_count += 1
+                elif tag == 'cmp' and in_handwritten_part:
+                    coords.extend(int(elem.get(key)) for key in ('x', 'y', 'width', 'height'))
+                continue
+            
+            if tag == 'handwritten-part':
+                in_handwritten_part = False
+            elem.clear()
+        
+        if not found_handwritten_part:
             logger.warning(f"No handwritten part found in {xml_file}")
             return None
         
-        lines = handwritten_part.findall('line')
-        if not lines:
+        if not line_count:
             logger.warning(f"No lines found in {xml_file}")
             return None
         
-        # Initialize boundary values
-        min_x = form_width
-        min_y = form_height
-        max_x = 0
-        max_y = 0
-        
         # Get min/max coordinates from all components in all words in all lines
-        for line in lines:
-            for word in line.findall('word'):
-                for cmp in word.findall('cmp'):
-                    x = int(cmp.get('x'))
-                    y = int(cmp.get('y'))
-                    width = int(cmp.get('width'))
-                    height = int(cmp.get('height'))
-                    
-                    min_x = min(min_x, x)
-                    min_y = min(min_y, y)
-                    max_x = max(max_x, x + width)
-                    max_y = max(max_y, y + height)
+        if not coords:
+            logger.warning(f"No components found in {xml_file}")
+            return None
+        
+        xs, ys, ws, hs = np.array(coords, dtype=np.int64).reshape(-1, 4).T
+        
+        min_x = int(xs.min())
+        min_y = int(ys.min())
+        max_x = int((xs + ws).max())
+        max_y = int((ys + hs).max())
         
         # Add some padding (5%)
         width = max_x - min_x
@@ -133,8 +152,8 @@ def crop_image(image_path, xml_path, output_path):
         if bounds is None:
             return False
         
-        # Read image
-        image = cv2.imread(str(image_path))
+        # Read image as stored (IAM forms are 8-bit grayscale) rather than expanding to BGR
+        image = cv2.imread(str(image_path), cv2.IMREAD_UNCHANGED)
         if image is None:
             logger.error(f"Could not read image: {image_path}")
             return False
@@ -145,13 +164,18 @@ def crop_image(image_path, xml_path, output_path):
         
         # Save cropped image
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        cv2.imwrite(str(output_path), cropped)
+        cv2.imwrite(str(output_path), cropped, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
         return True
         
     except Exception as e:
         logger.error(f"Error cropping {image_path}: {e}")
         return False
 
+def _process_one(task):
+    """Pool worker: crop a single (image_path, xml_path, output_path) task."""
+    image_path, xml_path, output_path = task
+    return crop_image(image_path, xml_path, output_path)
+
 def main():
     """Main function to process all images."""
     args = parse_args()
@@ -173,26 +197,20 @@ def main():
     
     logger.info(f"Found {len(image_files)} image files to process")
     
-    # Process each image
-    success_count = 0
+    # Pair each image with its XML file
+    tasks = []
     for img_path in image_files:
-        # Get corresponding XML file
-        base_name = img_path.stem  # filename without extension
-        xml_path = xml_dir / f"{base_name}.xml"
-        
-        # Check if XML file exists
+        xml_path = xml_dir / f"{img_path.stem}.xml"
         if not xml_path.exists():
             logger.warning(f"XML file not found for {img_path}")
             continue
-        
-        # Create output path
-        output_path = output_dir / img_path.name
-        
-        # Crop and save image
-        if crop_image(img_path, xml_path, output_path):
-            success_count += 1
-            if success_count % 20 == 0:
-                logger.info(f"Processed {success_count} images")
+        tasks.append((img_path, xml_path, output_dir / img_path.name))
+    
+    # Decoding and encoding are CPU-bound, so crop images in parallel processes
+    success_count = 0
+    with multiprocessing.Pool(args.workers) as pool:
+        for ok in tqdm(pool.imap_unordered(_process_one, tasks, chunksize=8), total=len(tasks), desc="Cropping images"):
+            success_count += ok
     
     logger.info(f"Completed. Successfully cropped {success_count} out of {len(image_files)} images.")
     logger.info(f"Cropped images saved to {output_dir}")
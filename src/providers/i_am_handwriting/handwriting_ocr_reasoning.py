@@ -1,10 +1,10 @@
-import json
 import os
 import sys
 import argparse
 import random
 import traceback
 from pathlib import Path
+from collections import namedtuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from tqdm import tqdm
@@ -26,168 +26,317 @@ from src.providers.i_am_handwriting.iam_utils import (
     GroundTruthExtractor, 
     ProgressTracker, 
     IncrementalResultSaver,
-    RecoveryManager
+    RecoveryManager,
+    write_json_array
 )
 from src.providers.salesforce_ocr.ocr_question_generator import OCRQuestionGenerator
 
 load_dotenv(project_root / ".env")
 
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+RESUME_MODES = ("auto", "interactive", "never")
+QUESTION_DIFFICULTIES = ("handwriting_basic", "handwriting_detailed", "handwriting_contextual")
+
+# Prompt templates and token budgets resolved once per run instead of per sample
+OCRPrompts = namedtuple('OCRPrompts', [
+    'raw', 'format_query', 'format_final', 'default_question',
+    'max_tokens', 'final_response_max_tokens', 'max_search_attempts'
+])
+
+def build_ocr_prompts(prompts):
+    """Resolve the handwriting prompt templates into an OCRPrompts bundle."""
+    # Expects a key like 'query_prompt_init' in handwriting_prompts.yaml
+    # Example: "Based on the image, please answer: {question}"
+    qna_prompt_template_str = prompts.get('query_prompt_init', "Please answer the following question about the image: {question}") # Default uses named
+    
+    # Make formatting robust: use named if {question} is present, else assume positional for backward compatibility or simpler templates
+    if "{question}" in qna_prompt_template_str:
+        format_query = lambda question: qna_prompt_template_str.format(question=question)
+    else:
+        # Assumes the template string expects one positional argument if {question} is not found
+        # This aligns with the original multimodal_QRA_pair.py if its query_prompt_init was like "Question: {}"
+        format_query = qna_prompt_template_str.format
+    
+    # Final response prompt uses positional formatting (natural reasoning, question) to match the YAML template
+    final_response_prompt_template = prompts.get('final_response_prompt', 
+        "Based on the internal thinking: {}\n\nFor the question: {}\n\nProvide a final response.")
+    
+    return OCRPrompts(
+        raw=prompts,
+        format_query=format_query,
+        format_final=final_response_prompt_template.format,
+        default_question=prompts.get('default_ocr_question', "What does the handwritten text in this image say?"),
+        max_tokens=prompts.get("max_tokens", 20000),
+        final_response_max_tokens=prompts.get("final_response_max_tokens", 20000),
+        max_search_attempts=prompts.get('max_search_attempts', 3)
+    )
+
+def _prepare_sample(image_path, xml_path, ground_truth_extractor, prompts, question_generator, ground_truth=None, difficulty=None):
+    """Extract the ground truth, generate a question and format the initial prompt."""
+    # Ground truth here is the full transcription from XML (possibly prefetched)
+    ground_truth_transcription = ground_truth
+    if ground_truth_transcription is None:
+        ground_truth_transcription = ground_truth_extractor.extract_text_from_xml(xml_path)
+    if not ground_truth_transcription:
+        ground_truth_transcription = "" # Placeholder
+
+    # Generate a question for the image
+    # Difficulty is normally assigned per sample up front; pick one here otherwise
+    question_difficulty = difficulty or random.choice(QUESTION_DIFFICULTIES)
+    # Ensure these difficulty levels exist or are handled in your OCRQuestionGenerator
+    # For example, if OCRQuestionGenerator has a 'handwriting' content_type:
+    generated_question = question_generator.generate_question(
+        difficulty_level=question_difficulty,
+        content_type="handwriting" # Assuming your generator supports this
+    )
+    if not generated_question:
+        generated_question = prompts.default_question
+
+    # Format the initial prompt using the query_prompt_init template
+    initial_prompt_content = prompts.format_query(generated_question)
+
+    return {
+        "image_id": Path(image_path).stem,
+        "image_path": str(image_path),
+        "xml_path": str(xml_path),
+        "ground_truth": ground_truth_transcription,
+        "question": generated_question,
+        "initial_prompt": initial_prompt_content,
+        "query_history": [f"Formatted Prompt: {initial_prompt_content}"],
+        "response_history": []
+    }
+
+def _refine_sample(state, initial_model_response, gpt_instance, reasoning_strategies, prompts):
+    """Run the reasoning strategies and natural reasoning synthesis; return the final response prompt."""
+    query_history = state["query_history"]
+    response_history = state["response_history"]
+    response_history.append(initial_model_response)
+
+    # Apply reasoning strategies with comprehensive verification
+    context_data = {
+        "image_urls": [state["image_path"]],
+        "question": state["question"], # The core question asked
+        "current_response": initial_model_response,
+        "ground_truth": state["ground_truth"],  # Use ground truth for verification
+        "query_history": query_history,
+        "response_history": response_history,
+        "content_type": "ocr"  # For handwriting OCR content
+    }
+    
+    strategy_result = reasoning_strategies.apply_all_strategies(
+        initial_model_response, # The text to refine (model's initial answer)
+        context_data=context_data,
+        max_strategies=prompts.max_search_attempts
+    )
+    
+    state["found_correct_answer"] = strategy_result.get("found_correct_answer", False)
+    state["strategies_used"] = strategy_result["strategies_used"]
+    query_history.extend([f"Applied strategy: {s}" for s in strategy_result["strategies_used"]])
+    # Assuming strategy_result["reasoning_trace"] contains only the steps taken by the strategies,
+    # not the initial_model_response that was passed to them.
+    # initial_model_response is already in response_history.
+    response_history.extend(strategy_result["reasoning_trace"])
+    
+    # Update query/response history from strategy results
+    query_history.extend(strategy_result.get("query_history", []))
+    response_history.extend(strategy_result.get("response_history", []))
+
+    # Synthesize Natural Reasoning
+    state["natural_reasoning"] = synthesize_natural_reasoning(
+        gpt_instance=gpt_instance, 
+        reasoning_history=response_history, # Use the full response history
+        question=state["question"],
+        prompts=prompts.raw # Pass the prompts dictionary for template lookup
+    )
+
+    # Generate final response using final_response_prompt (matching multimodal_simply.py pattern)
+    final_response_query = prompts.format_final(state["natural_reasoning"], state["question"])
+    query_history.append(final_response_query)
+    return final_response_query
+
+def _build_result(state, final_response, process_id):
+    """Assemble the saved record for a successfully processed sample."""
+    state["response_history"].append(final_response)
+
+    # Extract final conclusion (the answer) from the final response
+    # The final_response should be the most refined version, similar to multimodal_simply.py
+    extracted_answer = extract_final_conclusion(final_response, content_type="ocr") 
+
+    # Note: Ground truth verification is now performed during strategy application
+    return {
+        "process_id": process_id, # Added for consistency
+        "image_id": state["image_id"],
+        "image_path": state["image_path"],
+        "xml_path": state["xml_path"],
+        "Question": state["question"], # The question posed to the model
+        "Ground_True_Answer": state["ground_truth"], # Full transcription from XML
+        "Complex_CoT": state["natural_reasoning"], # Store the natural reasoning summary here
+        "Response": final_response, # Final response from the model (matching multimodal_simply.py)
+        "Extracted_Answer": extracted_answer, # Add extracted answer as separate field
+        "Found_Correct_Answer": state["found_correct_answer"],  # Track verification result
+        "Query_History": state["query_history"],
+        "Response_History": state["response_history"], # Detailed list of model responses/reasoning steps
+        "Strategies_Used": state["strategies_used"],
+        "status": "success"
+    }
+
+def _error_result(image_path, question, error, process_id):
+    """Assemble the saved record for a sample that failed at any stage."""
+    return {
+        "process_id": process_id,
+        "image_id": Path(image_path).stem,
+        "Question": question,
+        "error": str(error),
+        "traceback": "".join(traceback.format_exception(error)),
+        "status": "error"
+    }
+
 def process_sample_ocr(
     image_path: str, 
     xml_path: str, 
     gpt_instance: MultimodalGPT, 
     ground_truth_extractor: GroundTruthExtractor, 
     reasoning_strategies: ReasoningStrategies, 
-    prompts: dict,
+    prompts,
     question_generator: OCRQuestionGenerator,
     # Added process_id for consistency if ever needed for progress tracking like in multimodal_QRA_pair
-    process_id: int = 0 
+    process_id: int = 0,
+    ground_truth: str = None,
+    difficulty: str = None
 ):
     """
     Processes a single handwriting sample for Q&A, mirroring multimodal_QRA_pair.py structure.
-    1. Extracts ground truth text (full transcription) from XML.
+    1. Extracts ground truth text (full transcription) from XML, unless already prefetched.
     2. Generates a question about the image using OCRQuestionGenerator.
     3. Formats a prompt using the generated question and a template from prompts file.
     4. Gets an answer from MultimodalGPT based on the image and formatted prompt.
     5. Applies reasoning strategies for refinement.
     6. Extracts the final conclusion (answer).
     7. Tracks query and response history.
+    ``prompts`` is the raw prompts dict or a prebuilt OCRPrompts bundle.
     """
-    query_history = []
-    response_history = []
     generated_question = "Error before question generation" # Default for error case
 
     try:
-        image_id = Path(image_path).stem
-        # Ground truth here is the full transcription from XML
-        ground_truth_transcription = ground_truth_extractor.extract_text_from_xml(xml_path)
-        if not ground_truth_transcription:
-            ground_truth_transcription = "" # Placeholder
-
-        # Generate a question for the image
-        # You can customize difficulty and type
-        question_difficulty = random.choice(["handwriting_basic", "handwriting_detailed", "handwriting_contextual"])
-        # Ensure these difficulty levels exist or are handled in your OCRQuestionGenerator
-        # For example, if OCRQuestionGenerator has a 'handwriting' content_type:
-        generated_question = question_generator.generate_question(
-            difficulty_level=question_difficulty,
-            content_type="handwriting" # Assuming your generator supports this
-        )
-        if not generated_question:
-            generated_question = prompts.get('default_ocr_question', "What does the handwritten text in this image say?")
+        if not isinstance(prompts, OCRPrompts):
+            prompts = build_ocr_prompts(prompts)
+        state = _prepare_sample(image_path, xml_path, ground_truth_extractor, prompts, question_generator, ground_truth, difficulty)
+        generated_question = state["question"]
 
-        # 2. Format the initial prompt using a template (similar to query_prompt_init)
-        # Expects a key like 'handwriting_qna_prompt_template' in handwriting_prompts.yaml
-        # Example: "Based on the image, please answer: {question}"
-        qna_prompt_template_str = prompts.get('query_prompt_init', "Please answer the following question about the image: {question}") # Default uses named
-        
-        # Make formatting robust: use named if {question} is present, else assume positional for backward compatibility or simpler templates
-        if "{question}" in qna_prompt_template_str:
-            initial_prompt_content = qna_prompt_template_str.format(question=generated_question)
-        else:
-            # Assumes the template string expects one positional argument if {question} is not found
-            # This aligns with the original multimodal_QRA_pair.py if its query_prompt_init was like "Question: {}"
-            initial_prompt_content = qna_prompt_template_str.format(generated_question) 
-            
-        query_history.append(f"Formatted Prompt: {initial_prompt_content}")
-
-        # 3. Initial model call
+        # Initial model call
         initial_model_response = gpt_instance.call(
-            content=initial_prompt_content,
+            content=state["initial_prompt"],
             image_urls=[str(image_path)], 
-            additional_args={"max_tokens": prompts.get("max_tokens", 20000)} 
-        )
-        response_history.append(initial_model_response)
-
-        # 4. Apply reasoning strategies with comprehensive verification
-        context_data = {
-            "image_urls": [str(image_path)],
-            "question": generated_question, # The core question asked
-            "current_response": initial_model_response,
-            "ground_truth": ground_truth_transcription,  # Use ground truth for verification
-            "query_history": query_history,
-            "response_history": response_history,
-            "content_type": "ocr"  # For handwriting OCR content
-        }
-        
-        strategy_result = reasoning_strategies.apply_all_strategies(
-            initial_model_response, # The text to refine (model's initial answer)
-            context_data=context_data,
-            max_strategies=prompts.get('max_search_attempts', 3) 
-        )
-        
-        final_answer_text = strategy_result["final_result"]
-        found_correct_answer = strategy_result.get("found_correct_answer", False)
-        query_history.extend([f"Applied strategy: {s}" for s in strategy_result["strategies_used"]])
-        # Assuming strategy_result["reasoning_trace"] contains only the steps taken by the strategies,
-        # not the initial_model_response that was passed to them.
-        # initial_model_response is already in response_history.
-        response_history.extend(strategy_result["reasoning_trace"])
-        
-        # Update query/response history from strategy results
-        query_history.extend(strategy_result.get("query_history", []))
-        response_history.extend(strategy_result.get("response_history", []))
-
-        # 5. Synthesize Natural Reasoning (New Step)
-        natural_reasoning_text = synthesize_natural_reasoning(
-            gpt_instance=gpt_instance, 
-            reasoning_history=response_history, # Use the full response history
-            question=generated_question,
-            prompts=prompts # Pass the prompts dictionary for template lookup
+            additional_args={"max_tokens": prompts.max_tokens} 
         )
 
-        # 6. Generate final response using final_response_prompt (matching multimodal_simply.py pattern)
-        final_response_prompt_template = prompts.get('final_response_prompt', 
-            "Based on the internal thinking: {}\n\nFor the question: {}\n\nProvide a final response.")
-        
-        # Use positional formatting to match the YAML template
-        final_response_query = final_response_prompt_template.format(natural_reasoning_text, generated_question)
-        query_history.append(final_response_query)
+        final_response_query = _refine_sample(state, initial_model_response, gpt_instance, reasoning_strategies, prompts)
         
         final_response = gpt_instance.text_only_call(
             content=final_response_query,
-            additional_args={"max_tokens": prompts.get("final_response_max_tokens", 20000)}
+            additional_args={"max_tokens": prompts.final_response_max_tokens}
         )
-        response_history.append(final_response)
-
-        # 7. Extract final conclusion (the answer) from the final response
-        # The final_response should be the most refined version, similar to multimodal_simply.py
-        extracted_answer = extract_final_conclusion(final_response, content_type="ocr") 
-
-        # Note: Ground truth verification is now performed during strategy application
-        return {
-            "process_id": process_id, # Added for consistency
-            "image_id": image_id,
-            "image_path": str(image_path),
-            "xml_path": str(xml_path),
-            "Question": generated_question, # The question posed to the model
-            "Ground_True_Answer": ground_truth_transcription, # Full transcription from XML
-            "Complex_CoT": natural_reasoning_text, # Store the natural reasoning summary here
-            "Response": final_response, # Final response from the model (matching multimodal_simply.py)
-            "Extracted_Answer": extracted_answer, # Add extracted answer as separate field
-            "Found_Correct_Answer": found_correct_answer,  # Track verification result
-            "Query_History": query_history,
-            "Response_History": response_history, # Detailed list of model responses/reasoning steps
-            "Strategies_Used": strategy_result["strategies_used"],
-            "status": "success"
-        }
+        return _build_result(state, final_response, process_id)
 
     except Exception as e:
-        import traceback
-        # print(f"Error processing {Path(image_path).stem if 'image_path' in locals() else 'unknown image'}: {e}\n{traceback.format_exc()}")
-        return {
-            "process_id": process_id,
-            "image_id": Path(image_path).stem if 'image_path' in locals() else 'unknown',
-            "Question": generated_question,
-            "error": str(e),
-            "traceback": traceback.format_exc(),
-            "status": "error"
-        }
-
-def run_handwriting_ocr_reasoning(config_path: str = None, limit: int = None, resume: bool = True):
+        return _error_result(image_path, generated_question, e, process_id)
+
+class BatchedOCRRunner:
+    """
+    Run samples through the pipeline a chunk at a time, issuing each single-call
+    stage (initial vision call, final response call) as one concurrent batch.
+    The multi-call strategy stage still runs per sample on a worker pool.
+    """
+
+    def __init__(self, gpt_instance, ground_truth_extractor, reasoning_strategies, prompts,
+                 question_generator, batch_size=32, num_workers=4):
+        self.gpt = gpt_instance
+        self.ground_truth_extractor = ground_truth_extractor
+        self.reasoning_strategies = reasoning_strategies
+        self.prompts = prompts if isinstance(prompts, OCRPrompts) else build_ocr_prompts(prompts)
+        self.question_generator = question_generator
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+
+    def run(self, samples):
+        """Yield (sample, result) pairs, one chunk of batch_size samples at a time."""
+        for start in range(0, len(samples), self.batch_size):
+            yield from self._run_chunk(samples[start:start + self.batch_size])
+
+    def _run_chunk(self, chunk):
+        results = {}
+        states = {}
+        for sample in chunk:
+            try:
+                states[sample["process_id"]] = _prepare_sample(
+                    sample["image_path"], sample["xml_path"],
+                    self.ground_truth_extractor, self.prompts, self.question_generator,
+                    sample.get("ground_truth"), sample.get("difficulty")
+                )
+            except Exception as e:
+                results[sample["process_id"]] = _error_result(
+                    sample["image_path"], "Error before question generation", e, sample["process_id"]
+                )
+
+        # Stage 1: initial vision calls for the whole chunk
+        pending = [sample for sample in chunk if sample["process_id"] in states]
+        initial_responses = self.gpt.batch_call(
+            [states[s["process_id"]]["initial_prompt"] for s in pending],
+            [[str(s["image_path"])] for s in pending],
+            additional_args={"max_tokens": self.prompts.max_tokens}
+        )
+
+        # Stage 2: strategies and natural reasoning (several dependent calls per sample)
+        def refine(sample, initial_response):
+            if isinstance(initial_response, Exception):
+                raise initial_response
+            return _refine_sample(states[sample["process_id"]], initial_response,
+                                  self.gpt, self.reasoning_strategies, self.prompts)
+
+        final_queries = {}
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            futures = {executor.submit(refine, s, r): s for s, r in zip(pending, initial_responses)}
+            for future in as_completed(futures):
+                sample = futures[future]
+                try:
+                    final_queries[sample["process_id"]] = future.result()
+                except Exception as e:
+                    results[sample["process_id"]] = _error_result(
+                        sample["image_path"], states[sample["process_id"]]["question"], e, sample["process_id"]
+                    )
+
+        # Stage 3: final response calls for everything that got this far
+        pending = [sample for sample in pending if sample["process_id"] in final_queries]
+        final_responses = self.gpt.text_only_batch_call(
+            [final_queries[s["process_id"]] for s in pending],
+            additional_args={"max_tokens": self.prompts.final_response_max_tokens}
+        )
+        for sample, final_response in zip(pending, final_responses):
+            state = states[sample["process_id"]]
+            if isinstance(final_response, Exception):
+                results[sample["process_id"]] = _error_result(
+                    sample["image_path"], state["question"], final_response, sample["process_id"]
+                )
+            else:
+                results[sample["process_id"]] = _build_result(state, final_response, sample["process_id"])
+
+        for sample in chunk:
+            yield sample, results[sample["process_id"]]
+
+def run_handwriting_ocr_reasoning(config_path: str = None, limit: int = None, resume: bool = True, resume_mode: str = "auto"):
     """
     Main function to run the handwriting OCR Q&A pipeline.
+
+    resume_mode controls what happens when incomplete runs are found:
+    "auto" resumes the most recent one, "interactive" asks (falling back to
+    "auto" when stdin is not a terminal) and "never" starts fresh.
+    resume=False is equivalent to resume_mode="never".
     """
+    if resume_mode not in RESUME_MODES:
+        raise ValueError(f"resume_mode must be one of {RESUME_MODES}, got {resume_mode!r}")
+    if not resume:
+        resume_mode = "never"
+
     try:
         reasoning_config_obj = ReasoningConfig(
             config_file=config_path or "handwriting_config.yaml",
@@ -198,9 +347,7 @@ def run_handwriting_ocr_reasoning(config_path: str = None, limit: int = None, re
         question_generator = OCRQuestionGenerator()
 
         pipeline_config = reasoning_config_obj.config 
-        prompts_config = reasoning_config_obj.prompts # prompts from handwriting_prompts.yaml
-
-        ground_truth_extractor = GroundTruthExtractor()
+        prompts_config = build_ocr_prompts(reasoning_config_obj.prompts) # prompts from handwriting_prompts.yaml
 
         images_base_dir = project_root / pipeline_config.get("images_dir", "src/data/i_am_handwriting/cropped_handwritten")
         xml_base_dir = project_root / pipeline_config.get("xml_dir", "src/data/i_am_handwriting/xml")
@@ -212,13 +359,23 @@ def run_handwriting_ocr_reasoning(config_path: str = None, limit: int = None, re
             print(f"Error: XML directory not found: {xml_base_dir}")
             return
 
-        image_files = list(images_base_dir.glob("*.png")) + list(images_base_dir.glob("*.jpg")) + list(images_base_dir.glob("*.jpeg"))
+        # One directory scan each for images and XML, then pair by stem
+        with os.scandir(images_base_dir) as entries:
+            image_files = sorted(
+                Path(entry.path) for entry in entries
+                if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file()
+            )
+        with os.scandir(xml_base_dir) as entries:
+            xml_files = {
+                entry.name[:-len(".xml")]: Path(entry.path) for entry in entries
+                if entry.name.endswith(".xml")
+            }
         
         data_samples = []
         for idx, img_file in enumerate(image_files):
-            xml_file = xml_base_dir / (img_file.stem + ".xml")
-            if xml_file.exists():
-                data_samples.append({"image_path": img_file, "xml_path": xml_file, "process_id": idx})
+            xml_file = xml_files.get(img_file.stem)
+            if xml_file is not None:
+                data_samples.append({"image_path": img_file, "xml_path": xml_file, "process_id": idx, "image_id": img_file.stem})
             # else:
                 # print(f"Warning: XML file not found for image {img_file.name}, skipping.")
         
@@ -228,6 +385,11 @@ def run_handwriting_ocr_reasoning(config_path: str = None, limit: int = None, re
 
         if limit is not None and limit > 0:
             data_samples = data_samples[:limit]
+
+        # Assign question difficulties for the whole run at once (reproducible when a seed is configured)
+        difficulty_rng = random.Random(pipeline_config.get("seed"))
+        for sample, difficulty in zip(data_samples, difficulty_rng.choices(QUESTION_DIFFICULTIES, k=len(data_samples))):
+            sample["difficulty"] = difficulty
         
         print(f"Found {len(data_samples)} samples to process for Q&A.")
 
@@ -235,21 +397,32 @@ def run_handwriting_ocr_reasoning(config_path: str = None, limit: int = None, re
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_dir = project_root / pipeline_config.get("results_dir", "results")
         output_dir.mkdir(parents=True, exist_ok=True)
+        # Extracted transcriptions are cached alongside the results so reruns skip XML parsing
+        ground_truth_extractor = GroundTruthExtractor(cache_file=output_dir / "gt_cache.sqlite")
         results_file = output_dir / f"handwriting_qna_results_{timestamp}.json"
         
         # Check for recovery options if resume is enabled
         recovery_manager = RecoveryManager(output_dir)
-        if resume:
-            incomplete_runs = recovery_manager.find_incomplete_runs()
+        if resume_mode != "never":
+            # Finished runs keep their .progress file, so only offer ones with work left
+            incomplete_runs = [
+                run for run in recovery_manager.find_incomplete_runs()
+                if Path(run['results_file']).name.startswith("handwriting_qna_results_")
+                and run['processed_count'] < len(data_samples)
+            ]
             if incomplete_runs:
                 print("\n" + "="*60)
                 print("RECOVERY OPTIONS AVAILABLE")
                 print("="*60)
-                suggestions = recovery_manager.suggest_recovery_options(len(data_samples))
+                suggestions = recovery_manager.suggest_recovery_options(len(data_samples), incomplete_runs)
                 print(suggestions)
                 
-                response = input("Do you want to resume from the most recent run? (y/n): ").strip().lower()
-                if response == 'y' and incomplete_runs:
+                # Only prompt when someone can answer; headless runs resume automatically
+                if resume_mode == "interactive" and sys.stdin.isatty():
+                    response = input("Do you want to resume from the most recent run? (y/n): ").strip().lower()
+                else:
+                    response = 'y'
+                if response == 'y':
                     # Use the most recent incomplete run
                     latest_run = max(incomplete_runs, key=lambda x: x['last_updated'])
                     results_file = Path(latest_run['results_file'])
@@ -267,8 +440,7 @@ def run_handwriting_ocr_reasoning(config_path: str = None, limit: int = None, re
         # Filter out already processed samples
         remaining_samples = []
         for sample in data_samples:
-            image_id = Path(sample["image_path"]).stem
-            if not progress_tracker.is_processed(image_id):
+            if not progress_tracker.is_processed(sample["image_id"]):
                 remaining_samples.append(sample)
         
         if not remaining_samples:
@@ -279,73 +451,100 @@ def run_handwriting_ocr_reasoning(config_path: str = None, limit: int = None, re
         print(f"Resuming processing: {len(remaining_samples)} remaining out of {len(data_samples)} total samples")
         
         # Create backup of existing results
-        if results_file.exists():
+        if result_saver.log_file.exists():
             backup_file = result_saver.backup_results()
             if backup_file:
                 print(f"Created backup: {backup_file}")
 
-        results = []
         # Process remaining samples with progress tracking
         num_workers = pipeline_config.get("num_processes", os.cpu_count() or 1)
-        
-        with ThreadPoolExecutor(max_workers=num_workers) as executor:
-            future_to_sample = {
-                executor.submit(
-                    process_sample_ocr, 
-                    sample["image_path"], 
-                    sample["xml_path"], 
-                    gpt_instance, 
-                    ground_truth_extractor, 
-                    reasoning_strategies, 
-                    prompts_config,
-                    question_generator,
-                    sample["process_id"]
-                ): sample
-                for sample in remaining_samples
-            }
+
+        # Extract all ground truth up front so workers don't parse XML between API calls
+        ground_truths = ground_truth_extractor.prefetch([sample["xml_path"] for sample in remaining_samples], num_workers)
+        for sample in remaining_samples:
+            sample["ground_truth"] = ground_truths[str(sample["xml_path"])]
+        batch_size = pipeline_config.get("batch_size", 1) or 1
+
+        def record_result(sample, result, pbar):
+            # Save result immediately
+            result_saver.append_result(result)
             
-            # Process completed tasks and save incrementally
+            # Mark as processed
+            progress_tracker.mark_processed(sample["image_id"])
+            
+            # Update progress bar
+            if result.get("status") == "success":
+                pbar.set_postfix({"Status": "✓", "ID": sample["image_id"]})
+            else:
+                pbar.set_postfix({"Status": "✗", "Error": result.get("error", "unknown")[:50]})
+            
+            pbar.update(1)
+
+        def record_failure(sample, exc, pbar):
+            print(f"Critical error in future for sample {Path(sample['image_path']).name}: {exc}")
+            # Still mark as processed to avoid reprocessing
+            progress_tracker.mark_processed(sample["image_id"])
+            
+            error_result = {
+                "process_id": sample["process_id"],
+                "image_id": sample["image_id"], 
+                "error": str(exc), 
+                "status": "error_in_future"
+            }
+            result_saver.append_result(error_result)
+            pbar.update(1)
+        
+        if batch_size > 1:
+            # Batched mode: each API stage is sent for batch_size samples at once
+            runner = BatchedOCRRunner(
+                gpt_instance,
+                ground_truth_extractor,
+                reasoning_strategies,
+                prompts_config,
+                question_generator,
+                batch_size=batch_size,
+                num_workers=num_workers
+            )
             with tqdm(total=len(remaining_samples), desc="Processing samples") as pbar:
-                for future in as_completed(future_to_sample):
-                    sample = future_to_sample[future]
-                    try:
-                        result = future.result()
-                        
-                        # Save result immediately
-                        result_saver.append_result(result)
-                        results.append(result)  # Keep for backward compatibility
-                        
-                        # Mark as processed
-                        image_id = Path(sample["image_path"]).stem
-                        progress_tracker.mark_processed(image_id)
-                        
-                        # Update progress bar
-                        if result.get("status") == "success":
-                            pbar.set_postfix({"Status": "✓", "ID": result.get("image_id", "unknown")})
+                for sample, result in runner.run(remaining_samples):
+                    record_result(sample, result, pbar)
+        else:
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                future_to_sample = {
+                    executor.submit(
+                        process_sample_ocr, 
+                        sample["image_path"], 
+                        sample["xml_path"], 
+                        gpt_instance, 
+                        ground_truth_extractor, 
+                        reasoning_strategies, 
+                        prompts_config,
+                        question_generator,
+                        sample["process_id"],
+                        sample["ground_truth"],
+                        sample["difficulty"]
+                    ): sample
+                    for sample in remaining_samples
+                }
+                
+                # Process completed tasks and save incrementally
+                with tqdm(total=len(remaining_samples), desc="Processing samples") as pbar:
+                    for future in as_completed(future_to_sample):
+                        sample = future_to_sample[future]
+                        # perf: single future.result() per future; handling stays outside the try
+                        try:
+                            result = future.result()
+                        except Exception as exc:
+                            record_failure(sample, exc, pbar)
                         else:
-                            pbar.set_postfix({"Status": "✗", "Error": result.get("error", "unknown")[:50]})
-                        
-                        pbar.update(1)
-                        
-                    except Exception as exc:
-                        print(f"Critical error in future for sample {Path(sample['image_path']).name}: {exc}")
-                        # Still mark as processed to avoid reprocessing
-                        image_id = Path(sample["image_path"]).stem
-                        progress_tracker.mark_processed(image_id)
-                        
-                        error_result = {
-                            "process_id": sample["process_id"],
-                            "image_id": image_id, 
-                            "error": str(exc), 
-                            "status": "error_in_future"
-                        }
-                        result_saver.append_result(error_result)
-                        results.append(error_result)
-                        pbar.update(1)
+                            record_result(sample, result, pbar)
+
+        # Materialize the JSON results file from the append-only log
+        result_saver.finalize()
+        progress_tracker.close()
 
         # Final statistics
         stats = progress_tracker.get_stats()
-        all_results = result_saver.get_existing_results()
         
         print("\n" + "="*60)
         print("PROCESSING COMPLETE")
@@ -353,18 +552,38 @@ def run_handwriting_ocr_reasoning(config_path: str = None, limit: int = None, re
         print(f"Total processed: {stats['processed_count']}")
         print(f"Results saved to: {results_file}")
         print(f"Progress file: {results_file.with_suffix('.progress')}")
+
+        # Generate and save simplified output, streaming results from disk one at a time
+        counts = {"success": 0, "error": 0}
+        preview = []
+
+        def simplified_items():
+            for res in result_saver.iter_existing_results():
+                if len(preview) < 5:
+                    preview.append(res)
+                if res.get("status") == "success":
+                    counts["success"] += 1
+                    yield {
+                        'image_path': res.get('image_path'), # Keep image_path for reference
+                        'image_id': res.get('image_id'),
+                        'question': res.get('Question'),
+                        'reasoning': res.get('Complex_CoT'), # This is now the natural reasoning
+                        'answer': res.get('Response'),
+                        'ground_truth': res.get('Ground_True_Answer'), # Full transcription
+                        'strategies_used': res.get('Strategies_Used')
+                    }
+                else:
+                    counts["error"] += 1
+
+        simplified_output_path = results_file.with_name(results_file.stem + "_simplified.json")
+        write_json_array(simplified_output_path, simplified_items())
         
         # Summary of results
-        successful_count = sum(1 for r in all_results if r.get("status") == "success")
-        error_count = len(all_results) - successful_count
-        print(f"Successful: {successful_count}")
-        print(f"Errors: {error_count}")
-
-        # Prepare for simplified output
-        simplified_results = []
+        print(f"Successful: {counts['success']}")
+        print(f"Errors: {counts['error']}")
 
         # More detailed print for first few results
-        for i, res in enumerate(all_results[:min(5, len(all_results))]): 
+        for i, res in enumerate(preview): 
             print(f"\n--- Result {i+1} ---")
             if res.get("status") == "success":
                 print(f"  Image ID: {res['image_id']}")
@@ -381,24 +600,6 @@ def run_handwriting_ocr_reasoning(config_path: str = None, limit: int = None, re
 
         # Note: Results are already saved incrementally, no need to save again
         print(f"\nQ&A Results already saved incrementally to: {results_file}")
-
-        # Generate and save simplified output
-        for res in all_results:
-            if res.get("status") == "success":
-                simplified_item = {
-                    'image_path': res.get('image_path'), # Keep image_path for reference
-                    'image_id': res.get('image_id'),
-                    'question': res.get('Question'),
-                    'reasoning': res.get('Complex_CoT'), # This is now the natural reasoning
-                    'answer': res.get('Response'),
-                    'ground_truth': res.get('Ground_True_Answer'), # Full transcription
-                    'strategies_used': res.get('Strategies_Used')
-                }
-                simplified_results.append(simplified_item)
-
-        simplified_output_path = results_file.with_name(results_file.stem + "_simplified.json")
-        with open(simplified_output_path, 'w', encoding='utf-8') as f:
-            json.dump(simplified_results, f, indent=4)
         print(f"Simplified Q&A Results saved to: {simplified_output_path}")
 
     except FileNotFoundError as fnf_error:
@@ -424,7 +625,13 @@ if __name__ == "__main__":
     parser.add_argument(
         "--no-resume",
         action="store_true",
-        help="Start fresh without checking for previous progress (default: resume enabled)"
+        help="Start fresh without checking for previous progress (shorthand for --resume-mode never)"
+    )
+    parser.add_argument(
+        "--resume-mode",
+        choices=RESUME_MODES,
+        default="auto",
+        help="How to handle incomplete runs: resume the latest automatically (default), ask, or start fresh"
     )
     
     args = parser.parse_args()
@@ -432,5 +639,6 @@ if __name__ == "__main__":
     run_handwriting_ocr_reasoning(
         config_path=args.config, 
         limit=args.limit, 
-        resume=not args.no_resume
+        resume=not args.no_resume,
+        resume_mode=args.resume_mode
     )
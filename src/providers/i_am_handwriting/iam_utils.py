@@ -1,20 +1,66 @@
 import logging
 import xml.etree.ElementTree as ET
-import json
 import os
+import time
+import threading
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Set, Optional
-import fcntl
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+import orjson
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+def lock_exclusive(f):
+    """Take an exclusive lock on an open file; it is released when the file is closed."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        # msvcrt locks byte ranges, so lock the first byte as a whole-file mutex
+        position = f.tell()
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        f.seek(position)
+
+def write_json_array(path, items, pretty: bool = True) -> int:
+    """Stream ``items`` to ``path`` as a JSON array, one element at a time; returns the count."""
+    option = orjson.OPT_INDENT_2 if pretty else 0
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(b'[')
+        for item in items:
+            f.write(b',\n' if count else b'\n')
+            f.write(orjson.dumps(item, option=option))
+            count += 1
+        f.write(b'\n]' if count else b']')
+    return count
 
 class ProgressTracker:
-    """Track processing progress and enable resuming from failures."""
+    """
+    Track processing progress and enable resuming from failures.
+    
+    Each completion is appended to a ``.progress.log`` delta file; the full
+    ``.progress`` snapshot is only rewritten every SNAPSHOT_EVERY completions
+    or SNAPSHOT_INTERVAL seconds, and on ``flush()``.
+    """
+    
+    SNAPSHOT_EVERY = 32
+    SNAPSHOT_INTERVAL = 5.0
     
     def __init__(self, results_file: str, progress_file: str = None):
         self.results_file = Path(results_file)
         self.progress_file = Path(progress_file) if progress_file else self.results_file.with_suffix('.progress')
+        self.log_file = self.progress_file.with_suffix('.progress.log')
+        self.meta_file = self.progress_file.with_suffix('.progress.meta')
         self.processed_ids: Set[str] = set()
         self.logger = logging.getLogger("progress_tracker")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_snapshot = time.monotonic()
         
         # Ensure directories exist
         self.results_file.parent.mkdir(parents=True, exist_ok=True)
@@ -22,15 +68,20 @@ class ProgressTracker:
         
         # Load existing progress
         self._load_progress()
+        self._log = open(self.log_file, 'a')
     
     def _load_progress(self):
-        """Load previously processed image IDs from progress file."""
+        """Load previously processed image IDs from the snapshot, then replay the delta log."""
         try:
             if self.progress_file.exists():
-                with open(self.progress_file, 'r') as f:
-                    data = json.load(f)
+                with open(self.progress_file, 'rb') as f:
+                    data = orjson.loads(f.read())
                     self.processed_ids = set(data.get('processed_ids', []))
-                    self.logger.info(f"Loaded progress: {len(self.processed_ids)} items already processed")
+            if self.log_file.exists():
+                with open(self.log_file, 'r') as f:
+                    self.processed_ids.update(line.strip() for line in f if line.strip())
+            if self.processed_ids:
+                self.logger.info(f"Loaded progress: {len(self.processed_ids)} items already processed")
             else:
                 self.logger.info("No existing progress file found, starting fresh")
         except Exception as e:
@@ -41,13 +92,38 @@ class ProgressTracker:
         """Check if an image has already been processed."""
         return image_id in self.processed_ids
     
+    def snapshot_processed(self) -> Set[str]:
+        """Return a copy of the processed IDs, for filtering a whole batch at once."""
+        with self._lock:
+            return set(self.processed_ids)
+    
     def mark_processed(self, image_id: str):
-        """Mark an image as processed and save progress."""
-        self.processed_ids.add(image_id)
-        self._save_progress()
+        """Mark an image as processed, snapshotting progress periodically."""
+        with self._lock:
+            self.processed_ids.add(image_id)
+            try:
+                self._log.write(f"{image_id}\n")
+                self._log.flush()
+            except Exception as e:
+                self.logger.error(f"Error logging progress: {e}")
+            self._pending += 1
+            if (self._pending >= self.SNAPSHOT_EVERY
+                    or time.monotonic() - self._last_snapshot >= self.SNAPSHOT_INTERVAL):
+                self._save_progress()
+    
+    def flush(self):
+        """Write a snapshot of everything marked so far."""
+        with self._lock:
+            if self._pending:
+                self._save_progress()
+    
+    def close(self):
+        """Flush progress and release the delta log."""
+        self.flush()
+        self._log.close()
     
     def _save_progress(self):
-        """Save current progress to disk."""
+        """Save current progress to disk. Caller must hold ``_lock``."""
         try:
             progress_data = {
                 'processed_ids': list(self.processed_ids),
@@ -57,12 +133,24 @@ class ProgressTracker:
             
             # Atomic write using temporary file
             temp_file = self.progress_file.with_suffix('.progress.tmp')
-            with open(temp_file, 'w') as f:
-                json.dump(progress_data, f, indent=2)
+            with open(temp_file, 'wb') as f:
+                f.write(orjson.dumps(progress_data))
             
             # Atomic move
             temp_file.replace(self.progress_file)
             
+            # Small metadata sidecar so recovery scans don't parse every processed ID
+            temp_meta = self.meta_file.with_suffix('.meta.tmp')
+            with open(temp_meta, 'wb') as f:
+                f.write(orjson.dumps({k: progress_data[k] for k in ('last_updated', 'total_processed')}))
+            temp_meta.replace(self.meta_file)
+            
+            # Everything in the delta log is now in the snapshot
+            self._log.seek(0)
+            self._log.truncate()
+            self._pending = 0
+            self._last_snapshot = time.monotonic()
+            
         except Exception as e:
             self.logger.error(f"Error saving progress: {e}")
     
@@ -74,53 +162,71 @@ class ProgressTracker:
         }
 
 class IncrementalResultSaver:
-    """Save results incrementally with file locking for thread safety."""
+    """
+    Save results incrementally without cross-thread locking.
+    
+    Each writer thread appends to its own JSONL shard, opened once; shards are
+    merged into the JSONL log next to ``results_file`` by ``merge_shards()``,
+    and ``finalize()`` materializes the JSON array at ``results_file``.
+    
+    Every record is flushed as it is appended rather than batched: callers mark
+    the item in ProgressTracker right afterwards, so a result still sitting in a
+    buffer at a crash would be skipped on resume and never written.
+    """
     
     def __init__(self, results_file: str):
         self.results_file = Path(results_file)
+        self.log_file = self.results_file.with_suffix('.jsonl')
         self.logger = logging.getLogger("incremental_saver")
+        self._shards: Dict[int, object] = {}
+        self._shards_lock = threading.Lock()
         
         # Ensure directory exists
         self.results_file.parent.mkdir(parents=True, exist_ok=True)
         
         # Initialize file if it doesn't exist
-        if not self.results_file.exists():
+        if not self.log_file.exists():
             self._initialize_results_file()
+        
+        # Fold in shards left behind by an interrupted run
+        self.merge_shards()
     
     def _initialize_results_file(self):
-        """Initialize the results file as an empty JSON array."""
+        """Initialize the JSONL log, carrying over results from a legacy JSON array file."""
         try:
-            with open(self.results_file, 'w') as f:
-                json.dump([], f)
-            self.logger.info(f"Initialized results file: {self.results_file}")
+            legacy_results = []
+            if self.results_file.exists():
+                with open(self.results_file, 'rb') as f:
+                    legacy_results = orjson.loads(f.read())
+            
+            with open(self.log_file, 'wb') as f:
+                for result in legacy_results:
+                    f.write(orjson.dumps(result) + b'\n')
+            self.logger.info(f"Initialized results log: {self.log_file}")
         except Exception as e:
             self.logger.error(f"Error initializing results file: {e}")
             raise
     
+    def _shard_files(self) -> List[Path]:
+        return sorted(self.results_file.parent.glob(f"{self.results_file.stem}.shard-*.jsonl"))
+    
+    def _thread_shard(self):
+        """Return this thread's shard handle, opening it on first use."""
+        thread_id = threading.get_ident()
+        shard = self._shards.get(thread_id)
+        if shard is None:
+            shard_path = self.results_file.with_name(f"{self.results_file.stem}.shard-{thread_id}.jsonl")
+            shard = open(shard_path, 'ab')
+            with self._shards_lock:
+                self._shards[thread_id] = shard
+        return shard
+    
     def append_result(self, result: Dict):
-        """Append a single result to the file with file locking."""
+        """Append a single result to the calling thread's shard."""
         try:
-            # Read existing results
-            with open(self.results_file, 'r+') as f:
-                # Lock the file for exclusive access
-                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-                
-                try:
-                    f.seek(0)
-                    data = json.load(f)
-                except json.JSONDecodeError:
-                    # If file is corrupted, start fresh
-                    data = []
-                
-                # Append new result
-                data.append(result)
-                
-                # Write back to file
-                f.seek(0)
-                f.truncate()
-                json.dump(data, f, indent=2)
-                
-                # Unlock will happen automatically when file is closed
+            shard = self._thread_shard()
+            shard.write(orjson.dumps(result) + b'\n')
+            shard.flush()
             
             self.logger.debug(f"Appended result for image_id: {result.get('image_id', 'unknown')}")
             
@@ -128,29 +234,82 @@ class IncrementalResultSaver:
             self.logger.error(f"Error appending result: {e}")
             # Don't raise - we don't want to stop processing for save errors
     
+    def merge_shards(self):
+        """Close all shard handles and append their contents to the log, single-threaded."""
+        with self._shards_lock:
+            for shard in self._shards.values():
+                shard.close()
+            self._shards.clear()
+        
+        shard_files = self._shard_files()
+        if not shard_files:
+            return
+        
+        with open(self.log_file, 'ab') as log:
+            # Lock the log for exclusive access while shards are folded in
+            lock_exclusive(log)
+            for shard_path in shard_files:
+                content = shard_path.read_bytes()
+                if content and not content.endswith(b'\n'):
+                    # Terminate a truncated last line so it can't swallow the next record
+                    content += b'\n'
+                log.write(content)
+                log.flush()
+                shard_path.unlink()
+    
+    def iter_existing_results(self):
+        """Yield existing results one at a time from the log and any unmerged shards."""
+        if not self.log_file.exists():
+            # Runs that predate the JSONL log only have the JSON array
+            yield from self._read_results_file()
+            return
+        
+        for path in [self.log_file] + self._shard_files():
+            with open(path, 'rb') as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # A crash mid-append can leave a truncated last line
+                        self.logger.warning(f"Skipping unreadable line {line_number} in {path}")
+    
+    def _read_results_file(self) -> List[Dict]:
+        if self.results_file.exists():
+            with open(self.results_file, 'rb') as f:
+                return orjson.loads(f.read())
+        return []
+    
     def get_existing_results(self) -> List[Dict]:
         """Get all existing results from the file."""
         try:
-            if self.results_file.exists():
-                with open(self.results_file, 'r') as f:
-                    return json.load(f)
-            return []
+            return list(self.iter_existing_results())
         except Exception as e:
             self.logger.error(f"Error reading existing results: {e}")
             return []
     
+    def finalize(self) -> Path:
+        """Merge the shards and write the log out as a JSON array at ``results_file``."""
+        self.merge_shards()
+        temp_file = self.results_file.with_suffix('.json.tmp')
+        write_json_array(temp_file, self.iter_existing_results())
+        temp_file.replace(self.results_file)
+        return self.results_file
+    
     def backup_results(self, backup_suffix: str = None):
-        """Create a backup of the current results file."""
-        if not self.results_file.exists():
+        """Create a backup of the current results log."""
+        self.merge_shards()
+        if not self.log_file.exists():
             return
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_suffix = backup_suffix or f"backup_{timestamp}"
-        backup_file = self.results_file.with_suffix(f'.{backup_suffix}.json')
+        backup_file = self.log_file.with_suffix(f'.{backup_suffix}.jsonl')
         
         try:
             import shutil
-            shutil.copy2(self.results_file, backup_file)
+            shutil.copy2(self.log_file, backup_file)
             self.logger.info(f"Created backup: {backup_file}")
             return backup_file
         except Exception as e:
@@ -173,30 +332,36 @@ class RecoveryManager:
                 return incomplete_runs
             
             # Look for progress files
-            for progress_file in self.results_dir.glob("*.progress"):
+            with os.scandir(self.results_dir) as entries:
+                progress_files = [Path(entry.path) for entry in entries if entry.name.endswith('.progress')]
+            
+            for progress_file in progress_files:
                 results_file = progress_file.with_suffix('.json')
                 
-                if progress_file.exists():
-                    with open(progress_file, 'r') as f:
-                        progress_data = json.load(f)
-                    
-                    run_info = {
-                        'progress_file': str(progress_file),
-                        'results_file': str(results_file),
-                        'processed_count': progress_data.get('total_processed', 0),
-                        'last_updated': progress_data.get('last_updated', 'unknown'),
-                        'can_resume': True
-                    }
-                    incomplete_runs.append(run_info)
+                # Prefer the metadata sidecar; older runs only have the full snapshot
+                meta_file = progress_file.with_suffix('.progress.meta')
+                source = meta_file if meta_file.exists() else progress_file
+                with open(source, 'rb') as f:
+                    progress_data = orjson.loads(f.read())
+                
+                run_info = {
+                    'progress_file': str(progress_file),
+                    'results_file': str(results_file),
+                    'processed_count': progress_data.get('total_processed', 0),
+                    'last_updated': progress_data.get('last_updated', 'unknown'),
+                    'can_resume': True
+                }
+                incomplete_runs.append(run_info)
             
         except Exception as e:
             self.logger.error(f"Error finding incomplete runs: {e}")
         
         return incomplete_runs
     
-    def suggest_recovery_options(self, total_samples: int) -> str:
-        """Suggest recovery options for the user."""
-        incomplete_runs = self.find_incomplete_runs()
+    def suggest_recovery_options(self, total_samples: int, incomplete_runs: Optional[List[Dict]] = None) -> str:
+        """Suggest recovery options for the user, from ``incomplete_runs`` if given (else a fresh scan)."""
+        if incomplete_runs is None:
+            incomplete_runs = self.find_incomplete_runs()
         
         if not incomplete_runs:
             return "No incomplete runs found. Starting fresh is the only option."
@@ -213,37 +378,121 @@ class RecoveryManager:
         return "\n".join(suggestions)
 
 class GroundTruthExtractor:
-    """Extract ground truth text from IAM database XML files."""
+    """
+    Extract ground truth text from IAM database XML files.
+    
+    With ``cache_file`` set, extracted text is kept in a sqlite sidecar keyed by
+    (path, mtime, size) so reruns over the same dataset skip XML parsing.
+    """
     
-    def __init__(self):
+    # Bump when extraction output changes so cached transcriptions are not reused
+    EXTRACTION_VERSION = 2
+    
+    def __init__(self, cache_file: str = None):
         self.logger = logging.getLogger("ground_truth_extractor")
+        self._cache = None
+        self._cache_lock = threading.Lock()
+        if cache_file:
+            self._cache = sqlite3.connect(str(cache_file), check_same_thread=False)
+            self._cache.execute("CREATE TABLE IF NOT EXISTS ground_truth (key TEXT PRIMARY KEY, text TEXT)")
+            self._cache.commit()
+    
+    def _cache_key(self, xml_path) -> str:
+        st = os.stat(xml_path)
+        return f"v{self.EXTRACTION_VERSION}:{os.path.abspath(xml_path)}:{st.st_mtime_ns}:{st.st_size}"
+    
+    def _lookup(self, key: str) -> Optional[str]:
+        with self._cache_lock:
+            row = self._cache.execute("SELECT text FROM ground_truth WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+    
+    def _store(self, rows: List[tuple]):
+        # Empty results are not cached so files that failed to parse are retried
+        rows = [(key, text) for key, text in rows if text]
+        if not rows:
+            return
+        with self._cache_lock:
+            self._cache.executemany("INSERT OR REPLACE INTO ground_truth VALUES (?, ?)", rows)
+            self._cache.commit()
     
     def extract_text_from_xml(self, xml_path: str) -> str:
+        """Extract ground truth text from XML file, consulting the sidecar cache first."""
+        if self._cache is None:
+            return self._parse_xml(xml_path)
+        
+        try:
+            key = self._cache_key(xml_path)
+        except OSError as e:
+            self.logger.error(f"Error extracting text from {xml_path}: {str(e)}")
+            return ""
+        
+        ground_truth = self._lookup(key)
+        if ground_truth is None:
+            ground_truth = self._parse_xml(xml_path)
+            self._store([(key, ground_truth)])
+        return ground_truth
+    
+    def prefetch(self, xml_paths: List, max_workers: int = None) -> Dict[str, str]:
+        """Extract ground truth for many files up front; returns {str(xml_path): text}."""
+        xml_paths = [str(path) for path in xml_paths]
+        if self._cache is None:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return dict(zip(xml_paths, executor.map(self._parse_xml, xml_paths)))
+        
+        ground_truths = {}
+        misses = []
+        for path in xml_paths:
+            try:
+                key = self._cache_key(path)
+            except OSError as e:
+                self.logger.error(f"Error extracting text from {path}: {str(e)}")
+                ground_truths[path] = ""
+                continue
+            cached = self._lookup(key)
+            if cached is None:
+                misses.append((path, key))
+            else:
+                ground_truths[path] = cached
+        
+        # Parse the misses in parallel and store them in a single transaction
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            parsed = list(executor.map(self._parse_xml, [path for path, _ in misses]))
+        self._store([(key, text) for (_, key), text in zip(misses, parsed)])
+        ground_truths.update((path, text) for (path, _), text in zip(misses, parsed))
+        return ground_truths
+    
+    def _parse_xml(self, xml_path: str) -> str:
         """Extract ground truth text from XML file."""
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-            
-            # Extract all text elements
-            text_parts = []
-            for word in root.findall('.//word'):
-                text = word.get('text', '').strip()
-                if text:
-                    text_parts.append(text)
+            # Stream the document once, clearing each line as soon as its end tag
+            # has been seen. The first <line> decides the source: when it carries
+            # a text attribute the line texts are the transcription and <word>
+            # elements are skipped; otherwise the words are joined.
+            use_lines = None
+            parts = []
+            for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+                tag = elem.tag
+                if event == 'start':
+                    if tag == 'line':
+                        text = elem.get('text', '').strip()
+                        if use_lines is None:
+                            use_lines = bool(text)
+                        if use_lines and text:
+                            parts.append(text)
+                    continue
+                
+                if tag == 'word' and not use_lines:
+                    text = elem.get('text', '').strip()
+                    if text:
+                        parts.append(text)
+                elif tag == 'line':
+                    elem.clear()
             
             # Join with spaces
-            ground_truth = ' '.join(text_parts)
-            
-            if not ground_truth:
-                # Fallback: try to get from line elements
-                for line in root.findall('.//line'):
-                    text = line.get('text', '').strip()
-                    if text:
-                        text_parts.append(text)
-                ground_truth = ' '.join(text_parts)
+            ground_truth = ' '.join(parts)
             
             return ground_truth.strip()
             
         except Exception as e:
             self.logger.error(f"Error extracting text from {xml_path}: {str(e)}")
-            return ""
\ No newline at end of file
+            return ""
@@ -5,6 +5,7 @@ Adapts the existing processing function to work with the actual data structure.
 """
 
 import logging
+import itertools
 from typing import Dict, List
 from providers.radiopedia.radiopedia_report_reasoning import process_radiology_case
 
@@ -21,31 +22,20 @@ def adapt_case_data_for_processing(case_data: Dict) -> Dict:
         logger.info("Case data already in correct format")
         return case_data
     
-    # Extract image URLs from alternative structures (study_X_series_Y_)
-    image_urls = []
+    # Extract image URLs from alternative structures (study_X_series_Y_),
+    # skipping non-series keys like 'caption'
+    image_urls = list(itertools.chain.from_iterable(
+        series_data.get('urls', ())
+        for key, series_data in images_data.items()
+        if key not in ('series', 'caption') and isinstance(series_data, dict)
+    ))
     
-    for key, series_data in images_data.items():
-        # Skip non-series keys like 'caption'
-        if key == 'series' or key == 'caption':
-            continue
-            
-        if isinstance(series_data, dict) and 'urls' in series_data:
-            urls = series_data.get('urls', [])
-            image_urls.extend(urls)
-    
-    # Create adapted structure only if we found URLs to extract
-    if image_urls:
-        adapted_case = case_data.copy()
-        adapted_case['images'] = {
-            'series': [
-                {'urls': image_urls}
-            ]
-        }
-        logger.info(f"Adapted case data with {len(image_urls)} image URLs")
-        return adapted_case
+    # If no adaptation was possible, return original
+    if not image_urls:
+        return case_data
     
-    # If no adaptation was needed or possible, return original
-    return case_data
+    logger.info(f"Adapted case data with {len(image_urls)} image URLs")
+    return {**case_data, 'images': {'series': [{'urls': image_urls}]}}
 
 def process_radiology_case_adapted(
     case_data: dict,
@@ -54,7 +44,10 @@ def process_radiology_case_adapted(
     prompts: dict,
     report_formats: dict,
     question_generator,
-    process_id: int = 0
+    process_id: int = 0,
+    gt_generator=None,
+    text_caller=None,
+    gt_executor=None
 ) -> Dict:
     """Process radiology case with data structure adaptation."""
     
@@ -70,7 +63,10 @@ def process_radiology_case_adapted(
             prompts=prompts,
             report_formats=report_formats,
             question_generator=question_generator,
-            process_id=process_id
+            process_id=process_id,
+            gt_generator=gt_generator,
+            text_caller=text_caller,
+            gt_executor=gt_executor
         )
         
         return result
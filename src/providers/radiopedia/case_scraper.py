@@ -1,18 +1,30 @@
-import json
+import os
+import orjson
 import time
+import queue
+import atexit
+import weakref
 import threading
 import concurrent.futures
+import multiprocessing.util
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.action_chains import ActionChains
 from tqdm import tqdm
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from contextlib import contextmanager
 import sys
 from pathlib import Path
+from urllib.parse import urljoin, urlparse
+from collections import Counter
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import urllib3.exceptions
 import socket
@@ -25,7 +37,82 @@ from utils.path_config import get_radiopedia_data_path
 from utils.logger import setup_logger
 
 logger = setup_logger('case_scraper')
-thread_local = threading.local()
+# Always applied on top of the configured Chrome options: the scraper only reads
+# the DOM, so rendering images, extensions and background services is wasted work
+PERFORMANCE_CHROME_ARGS = (
+    "--headless=new",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-features=Translate,BackForwardCache",
+)
+
+# Only <img src> attributes are read, never the bytes, so image, font and tracker
+# requests are blocked at the network layer
+BLOCKED_URL_PATTERNS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg",
+    "*.woff", "*.woff2", "*.ttf",
+    "*google-analytics*", "*googletagmanager*", "*doubleclick*",
+]
+
+# Only timeouts and dropped connections are worth retrying on the same driver;
+# other WebDriver errors (crashed tab, dead session) are not fixed by waiting
+TRANSIENT_BROWSER_ERRORS = (
+    TimeoutException,
+    urllib3.exceptions.TimeoutError,
+    socket.timeout,
+    ConnectionError,
+)
+
+# Single-class lookups go through chromedriver's class-name strategy rather than
+# a CSS selector it has to parse on every poll of the wait loop
+MAIN_CONTENT_LOCATOR = (By.CLASS_NAME, "case-main-content")
+
+# Stop sending work to a host once this many of its URLs fail in a row
+MAX_CONSECUTIVE_HOST_FAILURES = 5
+
+# Study sections come in two layouts; both are collected in one document pass and
+# the 2022 viewer is preferred when present
+STUDY_SELECTOR = ".case-viewer-2022, .case-section.case-study"
+
+# Collects every field extract_case_data_browser needs in one WebDriver round-trip;
+# returns the same shape as RadiopaediaCaseScraper._read_case_page
+EXTRACT_CASE_JS = """
+const STUDY_SELECTOR = '%s';
+const text = el => el ? el.innerText.trim() : '';
+let discussion = document.querySelector('.case-discussion');
+if (!discussion) {
+    discussion = [...document.querySelectorAll('.case-section')]
+        .find(sec => sec.innerText.toLowerCase().includes('discussion'));
+}
+const sections = [...document.querySelectorAll(STUDY_SELECTOR)];
+const viewers = sections.filter(sec => sec.matches('.case-viewer-2022'));
+const studies = viewers.length ? viewers : sections;
+return {
+    title: text(document.querySelector('.header-title')),
+    modalities: [...document.querySelectorAll('.study-modality .label')].map(text),
+    data_items: [...document.querySelectorAll('.data-item')].map(text),
+    presentation: text(document.getElementById('case-patient-presentation')),
+    discussion: text(discussion),
+    studies: studies.map(sec => ({
+        title: text(sec.querySelector('.study-desc h2')),
+        caption: text(sec.querySelector('.study-findings.body') || sec.querySelector('.sub-section p, .caption')),
+        urls: [...sec.querySelectorAll("img[src*='radiopaedia']")].map(img => img.src)
+    }))
+};
+""" % STUDY_SELECTOR
+
+# Scrapers still open at interpreter exit; weak so the registry doesn't keep them alive
+_live_scrapers = weakref.WeakSet()
+
+
+@atexit.register
+def _close_live_scrapers():
+    for scraper in list(_live_scrapers):
+        scraper.close()
 
 
 class RadiopaediaCaseScraper:
@@ -36,54 +123,233 @@ class RadiopaediaCaseScraper:
         self.max_workers = self.config['default']['max_workers']
         self.timeout = self.config['default']['timeout']
         self.run_path = run_path or get_radiopedia_data_path()  # Use timestamped path if provided
+        
+        output_config = self.config['output']
+        self._urls_dir = self.run_path / output_config['directories']['scraped_urls']
+        self._cases_dir = self.run_path / output_config['directories']['scraped_cases']
+        self._url_suffix = output_config['url_file_suffix']
+        self._cases_suffix = output_config['cases_file_suffix']
+        
+        # Chrome instances outlive the worker threads that started them and are
+        # handed from URL to URL (and modality to modality) until close()
+        self._idle_drivers = queue.SimpleQueue()
+        self._drivers = []
+        self._drivers_lock = threading.Lock()
+        _live_scrapers.add(self)
+        
+        # Existing URLs per modality, with the file state (name, mtime, size) they were read at
+        self._existing_urls: Dict[str, Tuple[tuple, frozenset]] = {}
+        
+        # One keep-alive pool for every case page instead of a TCP/TLS handshake per URL;
+        # transient failures and rate limiting are retried (honouring Retry-After) by urllib3
+        self._http = requests.Session()
+        self._http.headers.update(self.config['scraping']['headers'])
+        adapter = HTTPAdapter(
+            pool_connections=self.max_workers,
+            pool_maxsize=self.max_workers * 2,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"GET"})
+            )
+        )
+        self._http.mount("https://", adapter)
+        self._http.mount("http://", adapter)
     
     def setup_driver(self) -> webdriver.Chrome:
         """Set up Chrome WebDriver with optimized options."""
         chrome_options = Options()
         for option in self.config['selenium']['chrome_options']:
+            # Legacy headless mode is much slower than --headless=new
+            if option not in PERFORMANCE_CHROME_ARGS and option != "--headless":
+                chrome_options.add_argument(option)
+        for option in PERFORMANCE_CHROME_ARGS:
             chrome_options.add_argument(option)
+        # Return from driver.get() on DOMContentLoaded; extraction waits for its own elements
+        chrome_options.page_load_strategy = "eager"
         
         driver = webdriver.Chrome(options=chrome_options)
         driver.execute_cdp_cmd('Page.setDownloadBehavior', {
             'behavior': 'allow', 
             'downloadPath': str(self.run_path)
         })
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        
+        # Never block forever on a stuck page, and keep implicit waits from stacking
+        # on top of the explicit WebDriverWait in extract_case_data_browser
+        driver.set_page_load_timeout(self.config['default'].get('page_load_timeout', self.timeout))
+        driver.implicitly_wait(0)
+        # Warm up the renderer so the first real case page doesn't pay for it
+        driver.get("about:blank")
         return driver
     
-    def get_driver(self) -> webdriver.Chrome:
-        """Get thread-local WebDriver instance."""
-        if not hasattr(thread_local, "driver"):
-            thread_local.driver = self.setup_driver()
-        return thread_local.driver
+    @contextmanager
+    def borrow_driver(self):
+        """Check out a persistent WebDriver, starting Chrome only if none is idle.
+        
+        A borrowed driver is used by exactly one caller until it is returned, so its
+        client never issues concurrent commands and selenium's single-connection
+        urllib3 pool is never exhausted. Keep it that way rather than sharing
+        drivers between threads.
+        """
+        try:
+            driver = self._idle_drivers.get_nowait()
+        except queue.Empty:
+            driver = self.setup_driver()
+            with self._drivers_lock:
+                self._drivers.append(driver)
+        
+        healthy = True
+        try:
+            yield driver
+        except WebDriverException as e:
+            # Anything other than a timeout usually means the session has died
+            healthy = isinstance(e, TimeoutException)
+            raise
+        finally:
+            if healthy:
+                self._idle_drivers.put(driver)
+            else:
+                self._discard_driver(driver)
     
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=2, min=1, max=10),
-        retry=retry_if_exception_type((
-            TimeoutException, 
-            WebDriverException, 
-            urllib3.exceptions.HTTPError,
-            urllib3.exceptions.TimeoutError,
-            urllib3.exceptions.ReadTimeoutError,
-            socket.timeout,
-            OSError,
-            ConnectionError
-        )),
-        reraise=True
-    )
-    def extract_case_data(self, url: str, driver: webdriver.Chrome) -> Optional[Dict]:
-        """Extract comprehensive case data from a Radiopaedia case page with retry logic."""
+    def _discard_driver(self, driver: webdriver.Chrome):
+        """Stop tracking a driver and quit it."""
+        with self._drivers_lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    
+    def close(self):
+        """Close the HTTP pool and quit every Chrome instance started by this scraper."""
+        _live_scrapers.discard(self)
+        self._http.close()
+        with self._drivers_lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        while True:
+            try:
+                self._idle_drivers.get_nowait()
+            except queue.Empty:
+                break
+    
+    def fetch_case_page(self, url: str) -> Optional[BeautifulSoup]:
+        """Fetch the server-rendered case page, or None if it lacks the case content."""
+        response = self._http.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, 'html.parser')
+        if soup.select_one(".case-main-content") is None:
+            return None
+        return soup
+    
+    def extract_case_data(self, url: str, driver: Optional[webdriver.Chrome] = None) -> Optional[Dict]:
+        """Extract case data over plain HTTP, falling back to the browser when needed.
+        
+        Case pages are server-rendered, so the text fields and image tags are
+        normally present in the HTML. Chrome is only started when the static
+        page is missing the case content or its images.
+        """
+        try:
+            soup = self.fetch_case_page(url)
+        except Exception as e:
+            logger.warning(f"HTTP fetch failed for {url}, falling back to browser: {str(e)}")
+            soup = None
+        
+        if soup is not None:
+            case_data = self._build_case_data(url, self._read_case_page(url, soup))
+            if case_data['images']:
+                total_images = sum(len(group.get('urls', [])) for group in case_data['images'].values())
+                logger.info(f"Successfully extracted {len(case_data['images'])} series with {total_images} images from {url}")
+                return case_data
+            logger.info(f"No images in static HTML, falling back to browser: {url}")
+        
+        if driver is not None:
+            return self.extract_case_data_browser(url, driver)
+        with self.borrow_driver() as driver:
+            return self.extract_case_data_browser(url, driver)
+    
+    @staticmethod
+    def _text(element) -> str:
+        """Visible text of a parsed element, one line per text node."""
+        return element.get_text("\n", strip=True) if element is not None else ''
+    
+    def _read_case_page(self, url: str, soup: BeautifulSoup) -> Dict:
+        """Pull the raw case fields out of a parsed page (same shape as EXTRACT_CASE_JS)."""
+        discussion = soup.select_one(".case-discussion")
+        if discussion is None:
+            discussion = next(
+                (sec for sec in soup.select(".case-section") if "discussion" in self._text(sec).lower()),
+                None
+            )
+        
+        studies = []
+        sections = soup.select(STUDY_SELECTOR)
+        viewers = [sec for sec in sections if 'case-viewer-2022' in sec.get('class', ())]
+        for section in viewers or sections:
+            caption = section.select_one(".study-findings.body") or section.select_one(".sub-section p, .caption")
+            studies.append({
+                'title': self._text(section.select_one(".study-desc h2")),
+                'caption': self._text(caption),
+                'urls': [urljoin(url, img['src']) for img in section.select("img[src*='radiopaedia']")]
+            })
+        
+        return {
+            'title': self._text(soup.select_one(".header-title")),
+            'modalities': [self._text(elem) for elem in soup.select(".study-modality .label")],
+            'data_items': [item.get_text(" ", strip=True) for item in soup.select(".data-item")],
+            'presentation': self._text(soup.find(id="case-patient-presentation")),
+            'discussion': self._text(discussion),
+            'studies': studies
+        }
+    
+    @staticmethod
+    def _build_case_data(url: str, page: Dict) -> Dict:
+        """Turn raw page fields into the case record written to disk."""
         case_data = {
             'url': url,
-            'title': '',
-            'modalities': [],
+            'title': page.get('title') or '',
+            'modalities': page.get('modalities') or [],
             'patient_age': '',
             'patient_gender': '',
-            'presentation': '',
-            'case_discussion': '',
+            'presentation': page.get('presentation') or '',
+            'case_discussion': page.get('discussion') or '',
             'images': {}
         }
         
+        for item_text in page.get('data_items') or []:
+            if "Age:" in item_text:
+                case_data['patient_age'] = item_text.replace("Age:", "").strip()
+            elif "Gender:" in item_text:
+                case_data['patient_gender'] = item_text.replace("Gender:", "").strip()
+        
+        for i, study in enumerate(page.get('studies') or [], 1):
+            image_urls = [src for src in study.get('urls') or [] if src and 'images' in src]
+            if image_urls:
+                case_data['images'][f"series_{i}"] = {
+                    'study_title': study.get('title') or f"Study {i}",
+                    'series_name': 'Main Series',
+                    'urls': image_urls,
+                    'caption': study.get('caption') or ''
+                }
+        
+        return case_data
+    
+    @retry(
+        stop=stop_after_attempt(2),
+        wait=wait_exponential(multiplier=0.5, max=3),
+        retry=retry_if_exception_type(TRANSIENT_BROWSER_ERRORS),
+        reraise=True
+    )
+    def extract_case_data_browser(self, url: str, driver: webdriver.Chrome) -> Optional[Dict]:
+        """Extract comprehensive case data from a Radiopaedia case page with retry logic."""
         try:
             logger.info(f"Attempting to extract data from: {url}")
             driver.get(url)
@@ -91,61 +357,13 @@ class RadiopaediaCaseScraper:
             
             # Wait for main content
             try:
-                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".case-main-content")))
+                wait.until(EC.presence_of_element_located(MAIN_CONTENT_LOCATOR))
             except TimeoutException:
                 logger.warning(f"Timeout waiting for main content: {url}")
                 raise  # Re-raise to trigger retry
             
-            # Extract title
-            try:
-                title_element = driver.find_element(By.CLASS_NAME, "header-title")
-                case_data['title'] = title_element.text.strip()
-            except NoSuchElementException:
-                logger.warning(f"No title found: {url}")
-            
-            # Extract modality
-            try:
-                modality_elements = driver.find_elements(By.CSS_SELECTOR, ".study-modality .label")
-                case_data['modalities'] = [elem.text.strip() for elem in modality_elements]
-            except:
-                logger.warning(f"No modality found: {url}")
-            
-            # Extract patient data
-            try:
-                data_items = driver.find_elements(By.CSS_SELECTOR, ".data-item")
-                for item in data_items:
-                    item_text = item.text.strip()
-                    if "Age:" in item_text:
-                        case_data['patient_age'] = item_text.replace("Age:", "").strip()
-                    elif "Gender:" in item_text:
-                        case_data['patient_gender'] = item_text.replace("Gender:", "").strip()
-            except:
-                logger.warning(f"No patient data found: {url}")
-            
-            # Extract presentation
-            try:
-                presentation_items = driver.find_elements(By.ID, "case-patient-presentation")
-                for item in presentation_items:
-                    case_data['presentation'] = item.text.strip()
-            except:
-                logger.warning(f"No presentation found: {url}")
-            
-            # Extract case discussion
-            try:
-                discussion_element = driver.find_element(By.CSS_SELECTOR, ".case-discussion")
-                case_data['case_discussion'] = discussion_element.text.strip()
-            except NoSuchElementException:
-                try:
-                    discussion_sections = driver.find_elements(By.CSS_SELECTOR, ".case-section")
-                    for section in discussion_sections:
-                        if "discussion" in section.text.lower():
-                            case_data['case_discussion'] = section.text.strip()
-                            break
-                except:
-                    logger.warning(f"No case discussion found: {url}")
-            
-            # Extract images - simplified approach for now
-            self._extract_images(driver, case_data)
+            # All fields in a single round-trip instead of one per element
+            case_data = self._build_case_data(url, driver.execute_script(EXTRACT_CASE_JS))
             
             total_images = sum(len(group.get('urls', [])) for group in case_data['images'].values())
             logger.info(f"Successfully extracted {len(case_data['images'])} series with {total_images} images from {url}")
@@ -168,114 +386,92 @@ class RadiopaediaCaseScraper:
             logger.error(f"Non-retryable error processing {url}: {str(e)}")
             return None
     
-    def _extract_images(self, driver: webdriver.Chrome, case_data: Dict):
-        """Extract image data from case page."""
-        study_sections = driver.find_elements(By.CSS_SELECTOR, ".case-viewer-2022")
-        if not study_sections:
-            study_sections = driver.find_elements(By.CSS_SELECTOR, ".case-section.case-study")
-        
-        for i, section in enumerate(study_sections, 1):
-            study_title = f"Study {i}"
-            try:
-                study_title_element = section.find_element(By.CSS_SELECTOR, ".study-desc h2")
-                study_title = study_title_element.text.strip()
-            except:
-                pass
-            
-            # Get study caption
-            study_caption = ""
-            try:
-                findings_div = section.find_element(By.CSS_SELECTOR, ".study-findings.body")
-                study_caption = findings_div.text.strip()
-            except:
-                try:
-                    caption_elements = section.find_elements(By.CSS_SELECTOR, ".sub-section p, .caption")
-                    if caption_elements:
-                        study_caption = caption_elements[0].text.strip()
-                except:
-                    study_caption = "Caption not available"
-            
-            # Extract image URLs (simplified)
-            image_urls = []
-            try:
-                img_elements = section.find_elements(By.CSS_SELECTOR, "img[src*='radiopaedia']")
-                for img in img_elements:
-                    src = img.get_attribute('src')
-                    if src and 'images' in src:
-                        image_urls.append(src)
-            except:
-                pass
-            
-            if image_urls:
-                case_data['images'][f"series_{i}"] = {
-                    'study_title': study_title,
-                    'series_name': 'Main Series',
-                    'urls': image_urls,
-                    'caption': study_caption
-                }
-    
     def load_case_urls(self, modality: str) -> List[str]:
         """Load case URLs from file."""
-        url_filename = f"{modality}{self.config['output']['url_file_suffix']}"
-        urls_dir = self.run_path / self.config['output']['directories']['scraped_urls']
-        filepath = urls_dir / url_filename
+        filepath = self._urls_dir / f"{modality}{self._url_suffix}"
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return orjson.loads(filepath.read_bytes())
         except Exception as e:
             logger.error(f"Error loading URLs from {filepath}: {e}")
             return []
     
+    @staticmethod
+    def _case_shards(filepath: Path) -> List[Path]:
+        """Per-process JSONL shards (<cases stem>.<pid>.jsonl) next to a cases file."""
+        return sorted(filepath.parent.glob(f"{filepath.stem}.*.jsonl"))
+    
+    def _cases_file(self, modality: str) -> Path:
+        return self._cases_dir / f"{modality}{self._cases_suffix}"
+    
     def load_existing_cases(self, modality: str) -> List[Dict]:
-        """Load existing cases from output file."""
-        cases_filename = f"{modality}{self.config['output']['cases_file_suffix']}"
-        cases_dir = self.run_path / self.config['output']['directories']['scraped_cases']
-        filepath = cases_dir / cases_filename
+        """Load existing cases from the output file plus any not-yet-merged shards."""
+        filepath = self._cases_file(modality)
         
+        cases = []
         if filepath.exists():
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                cases = orjson.loads(filepath.read_bytes())
             except Exception as e:
                 logger.error(f"Error loading existing cases: {e}")
-                return []
-        return []
+        
+        # Cases scraped by an interrupted run only made it into the worker shards
+        seen_urls = {case['url'] for case in cases}
+        for shard in self._case_shards(filepath):
+            with open(shard, 'rb') as f:
+                for line in f:
+                    try:
+                        case = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue  # Torn last line from a crash
+                    if case['url'] not in seen_urls:
+                        seen_urls.add(case['url'])
+                        cases.append(case)
+        return cases
     
-    def save_cases(self, cases: List[Dict], modality: str):
+    def load_existing_urls(self, modality: str) -> frozenset:
+        """URLs already scraped for a modality, re-read only when the files on disk change."""
+        filepath = self._cases_file(modality)
+        
+        state = []
+        for path in [filepath, *self._case_shards(filepath)]:
+            if path.exists():
+                stat = path.stat()
+                state.append((path.name, stat.st_mtime_ns, stat.st_size))
+        state = tuple(state)
+        
+        cached = self._existing_urls.get(modality)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+        urls = frozenset(case['url'] for case in self.load_existing_cases(modality))
+        self._existing_urls[modality] = (state, urls)
+        return urls
+    
+    def save_cases(self, cases: List[Dict], modality: str) -> bool:
         """Save cases to JSON file."""
-        cases_filename = f"{modality}{self.config['output']['cases_file_suffix']}"
-        cases_dir = self.run_path / self.config['output']['directories']['scraped_cases']
-        cases_dir.mkdir(exist_ok=True)
-        filepath = cases_dir / cases_filename
+        self._cases_dir.mkdir(exist_ok=True)
+        filepath = self._cases_file(modality)
         
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(cases, f, indent=2, ensure_ascii=False)
+            filepath.write_bytes(orjson.dumps(cases, option=orjson.OPT_INDENT_2))
             logger.info(f"Saved {len(cases)} cases to {filepath}")
+            return True
         except Exception as e:
             logger.error(f"Error saving cases: {e}")
+            return False
     
-    def process_single_url(self, url: str, output_file: str, lock: threading.Lock) -> bool:
-        """Process a single URL and save the case data."""
-        driver = self.get_driver()
+    def process_single_url(self, url: str, out_fp) -> bool:
+        """Process a single URL and append the case data as one JSON line.
         
+        Nothing is read back here: each line is flushed so an interrupted run can
+        resume from it, and the shards are merged once by scrape_modality_cases.
+        """
         try:
-            case_data = self.extract_case_data(url, driver)
+            case_data = self.extract_case_data(url)
             
             if case_data:
-                with lock:
-                    try:
-                        with open(output_file, 'r', encoding='utf-8') as f:
-                            all_case_data = json.load(f)
-                    except:
-                        all_case_data = []
-                    
-                    all_case_data.append(case_data)
-                    
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        json.dump(all_case_data, f, indent=2, ensure_ascii=False)
-                
+                out_fp.write(orjson.dumps(case_data, option=orjson.OPT_APPEND_NEWLINE))
+                out_fp.flush()
                 return True
             return False
         
@@ -294,49 +490,98 @@ class RadiopaediaCaseScraper:
         case_urls = case_urls[:limit]
         
         # Filter out already processed URLs
-        existing_cases = self.load_existing_cases(modality)
-        existing_urls = {case['url'] for case in existing_cases}
+        existing_urls = self.load_existing_urls(modality)
         case_urls = [url for url in case_urls if url not in existing_urls]
         
         if not case_urls:
             logger.info(f"All URLs for {modality} already processed")
-            return len(existing_cases)
+            return len(existing_urls)
         
         logger.info(f"Processing {len(case_urls)} new URLs for {modality}")
         
-        cases_filename = f"{modality}{self.config['output']['cases_file_suffix']}"
-        cases_dir = self.run_path / self.config['output']['directories']['scraped_cases']
-        cases_dir.mkdir(exist_ok=True)
-        output_file = cases_dir / cases_filename
+        self._cases_dir.mkdir(exist_ok=True)
+        output_file = self._cases_file(modality)
+        shard_prefix = str(self._cases_dir / output_file.stem)
         
-        lock = threading.Lock()
         success_count = 0
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        # One scraper (and at most one Chrome) per process, each appending to its own
+        # shard, so neither the GIL nor a file lock is shared between workers
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(self.run_path,)
+        ) as executor:
             futures = {
-                executor.submit(self.process_single_url, url, output_file, lock): url 
+                executor.submit(_process_url_in_worker, url, shard_prefix): url 
                 for url in case_urls
             }
             
+            consecutive_failures = Counter()
+            # Throttled redraws keep the progress bar off the completion path
             for future in tqdm(concurrent.futures.as_completed(futures), 
-                             total=len(futures), desc=f"Scraping {modality}"):
+                             total=len(futures), desc=f"Scraping {modality}",
+                             mininterval=1.0, miniters=max(1, len(futures) // 100)):
+                if future.cancelled():
+                    continue
+                host = urlparse(futures[future]).netloc
                 try:
                     success = future.result()
-                    if success:
-                        success_count += 1
                 except Exception as e:
                     logger.error(f"Future error: {str(e)}")
+                    success = False
+                
+                if success:
+                    success_count += 1
+                    consecutive_failures[host] = 0
+                    continue
+                
+                consecutive_failures[host] += 1
+                if consecutive_failures[host] == MAX_CONSECUTIVE_HOST_FAILURES:
+                    # Circuit breaker: the host is down or blocking us, skip its remaining URLs
+                    skipped = sum(
+                        pending.cancel() for pending, pending_url in futures.items()
+                        if urlparse(pending_url).netloc == host
+                    )
+                    logger.error(f"{MAX_CONSECUTIVE_HOST_FAILURES} consecutive failures on {host}, "
+                                 f"skipping {skipped} remaining URLs for this run")
         
-        # Cleanup drivers
-        for thread_id, thread in threading._active.copy().items():
-            if hasattr(thread, "driver"):
-                try:
-                    thread.driver.quit()
-                except:
-                    pass
+        # Merge the shards into the pretty JSON array downstream steps read
+        if self.save_cases(self.load_existing_cases(modality), modality):
+            for shard in self._case_shards(output_file):
+                shard.unlink()
         
-        total_cases = len(existing_cases) + success_count
+        total_cases = len(existing_urls) + success_count
         logger.info(f"Successfully processed {success_count} new cases for {modality}")
         logger.info(f"Total cases for {modality}: {total_cases}")
         
         return total_cases
+
+
+# Per-process state for ProcessPoolExecutor workers
+_worker_scraper: Optional[RadiopaediaCaseScraper] = None
+_worker_shard = None
+
+
+def _close_worker():
+    if _worker_shard is not None:
+        _worker_shard.close()
+    if _worker_scraper is not None:
+        _worker_scraper.close()
+
+
+def _init_worker(run_path: Path):
+    """Create this process's scraper; its browser and shard are opened lazily."""
+    global _worker_scraper
+    _worker_scraper = RadiopaediaCaseScraper(run_path)
+    # Pool workers leave via os._exit(), which skips atexit; multiprocessing
+    # finalizers still run, so Chrome is quit when the worker shuts down
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
+
+
+def _process_url_in_worker(url: str, shard_prefix: str) -> bool:
+    """Scrape one URL in a pool worker, appending to this process's shard."""
+    global _worker_shard
+    if _worker_shard is None:
+        _worker_shard = open(f"{shard_prefix}.{os.getpid()}.jsonl", 'ab')
+    return _worker_scraper.process_single_url(url, _worker_shard)
@@ -5,30 +5,117 @@ Uses Gemini 2.0 Flash to intelligently extract ground truth from case metadata.
 
 import json
 import re
+import asyncio
+import hashlib
+import string
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Set, Any, Optional, Container, Iterable, Iterator, AsyncIterator, Callable
 from pathlib import Path
+import orjson
 import requests
-from openai import OpenAI
+from openai import (
+    OpenAI,
+    AsyncOpenAI,
+    RateLimitError,
+    APITimeoutError,
+    APIConnectionError,
+    InternalServerError,
+)
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Rate limits, timeouts, dropped connections and 5xx are worth another attempt;
+# auth and bad-request errors go straight to the fallback
+_api_retry = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=1, max=30),
+    retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)),
+    reraise=True
+)
+
+
+def compile_template(template: str) -> Callable[..., str]:
+    """
+    Parse a ``str.format`` template once and return a keyword-only formatter.
+    
+    Only plain ``{name}`` fields are supported; the result equals
+    ``template.format(**fields)`` without re-parsing the template on every call.
+    """
+    parts = []
+    for literal, field, format_spec, conversion in string.Formatter().parse(template):
+        if format_spec or conversion:
+            raise ValueError(f"Unsupported field in template: {{{field}!{conversion}:{format_spec}}}")
+        parts.append((literal, field))
+    
+    def render(**fields: Any) -> str:
+        return "".join(
+            literal if field is None else f"{literal}{fields[field]}"
+            for literal, field in parts
+        )
+    return render
+
+
+def load_jsonl(path: Path) -> Iterator[Any]:
+    """Lazily yield the records of a JSONL file, skipping a torn final line."""
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+
 class DynamicGroundTruthGenerator:
     """
     Intelligent ground truth extraction using AI rather than static templates.
     Uses Gemini 2.0 Flash with temperature 0 for consistent, deterministic results.
     """
     
+    _MODALITY_MAP = {
+        'mammography': 'mammography',
+        'x-ray': 'x-ray',
+        'ct': 'ct',
+        'mri': 'mri',
+        'ultrasound': 'ultrasound'
+    }
+    
+    # Output budget per modality: the CT/US/X-ray templates ask for a handful of
+    # short sections, mammography adds BI-RADS and teaching points
+    _MAX_TOKENS = {
+        'mammography': 1800,
+        'ct': 1200,
+        'mri': 1400,
+        'ultrasound': 1000,
+        'x-ray': 1000
+    }
+    DEFAULT_MAX_TOKENS = 2000
+    
+    # Requests in flight at once during batch generation
+    MAX_CONCURRENT_REQUESTS = 16
+    
+    # The only per-case part of a request. Modality instructions are sent before it
+    # and are byte-identical across cases, so providers can reuse the cached prefix.
+    CASE_INFORMATION_TEMPLATE = """**Case Information:**
+- Modality: {modality}
+- Patient: {patient_age}, {patient_gender}
+- Presentation: {presentation}
+- Image Caption: {image_caption}
+- Series: {series_information}
+- Expert Discussion: {case_discussion}
+"""
+    
     def __init__(self):
         self.api_key = os.getenv("OPEN_ROUTER_API_KEY")
         if not self.api_key:
             raise ValueError("OPEN_ROUTER_API_KEY environment variable not set")
         
+        # Retries are handled by _api_retry, not stacked on the SDK's own
         self.client = OpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=self.api_key,
+            max_retries=0,
         )
         
         self.model_name = "google/gemini-2.5-flash-preview-05-20"  # Most capable model
@@ -42,6 +129,12 @@ class DynamicGroundTruthGenerator:
             'ultrasound': self._get_ultrasound_prompt(),
             'x-ray': self._get_xray_prompt()
         }
+        self.universal_prompt = self._get_universal_prompt()
+        self._format_case_information = compile_template(self.CASE_INFORMATION_TEMPLATE)
+        
+        # Successful responses by request digest. Many cases have placeholder-only
+        # fields and produce byte-identical prompts; those are only sent once.
+        self._response_cache: Dict[str, str] = {}
     
     def generate_ground_truth(self, case_data: Dict[str, Any]) -> str:
         """
@@ -53,43 +146,125 @@ class DynamicGroundTruthGenerator:
             Raw text string containing the formatted ground truth document.
         """
         try:
-            modality = self._detect_modality(case_data)
-            
-            # Prepare comprehensive context
-            context = self._prepare_case_context(case_data)
-            
-            # Get modality-specific prompt
-            prompt = self.modality_prompts.get(modality, self._get_universal_prompt())
+            request = self._build_request(case_data)
+            key = self._request_key(request)
+            if key in self._response_cache:
+                return self._response_cache[key]
             
-            # Format the prompt with case context
-            formatted_prompt = prompt.format(**context)
-            
-            # Call AI with deterministic settings
-            # Call AI with deterministic settings to produce a structured, human-readable text ground truth
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert radiologist extracting ground truth from medical case information. Provide accurate, conservative assessments based on the evidence presented. Respond with a structured, human-readable text document."
-                    },
-                    {
-                        "role": "user",
-                        "content": formatted_prompt
-                    }
-                ],
-                temperature=0.0,  # Deterministic results
-                max_tokens=4000
-            )
+            response = self._create_completion(request)
 
             # Return raw text as ground truth
-            ground_truth_text = response.choices[0].message.content
+            ground_truth_text = self._response_text(response, case_data)
+            if ground_truth_text:
+                self._response_cache[key] = ground_truth_text
             return ground_truth_text
             
         except Exception as e:
             self.logger.error(f"Error generating ground truth for {case_data.get('case_url', 'unknown')}: {e}")
             return self._fallback_ground_truth(case_data, str(e))
     
+    def generate_ground_truth_stream(self, case_data: Dict[str, Any]) -> Iterator[str]:
+        """
+        Stream the ground truth text for one case as it is generated.
+        
+        Callers can start persisting or parsing the early sections (headings come
+        first) while the rest is still being produced. Unlike generate_ground_truth
+        there is no fallback record: API errors are raised to the caller.
+        
+        Args:
+            case_data: Complete case information from Radiopaedia
+        Yields:
+            Text fragments whose concatenation is the full ground truth document.
+        """
+        request = self._build_request(case_data)
+        key = self._request_key(request)
+        if key in self._response_cache:
+            yield self._response_cache[key]
+            return
+        
+        chunks = []
+        for chunk in self._create_completion({**request, "stream": True}):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                chunks.append(delta)
+                yield delta
+        
+        if chunks:
+            self._response_cache[key] = "".join(chunks)
+    
+    async def _agenerate_ground_truth(self, client: AsyncOpenAI, case_data: Dict[str, Any],
+                                      request: Optional[Dict[str, Any]] = None) -> str:
+        """Async counterpart of generate_ground_truth on a shared AsyncOpenAI client."""
+        try:
+            if request is None:
+                request = self._build_request(case_data)
+            key = self._request_key(request)
+            if key in self._response_cache:
+                return self._response_cache[key]
+            
+            response = await self._acreate_completion(client, request)
+            ground_truth_text = self._response_text(response, case_data)
+            if ground_truth_text:
+                self._response_cache[key] = ground_truth_text
+            return ground_truth_text
+            
+        except Exception as e:
+            self.logger.error(f"Error generating ground truth for {case_data.get('case_url', 'unknown')}: {e}")
+            return self._fallback_ground_truth(case_data, str(e))
+    
+    def _response_text(self, response, case_data: Dict[str, Any]) -> str:
+        """Text of a completion, warning when it was cut off by the max_tokens budget."""
+        choice = response.choices[0]
+        if choice.finish_reason == "length":
+            self.logger.warning(f"Ground truth truncated at max_tokens for {case_data.get('case_url', 'unknown')}")
+        return choice.message.content
+    
+    @staticmethod
+    def _request_key(request: Dict[str, Any]) -> str:
+        """Digest of a completion request; identical prompts share one response."""
+        return hashlib.blake2b(orjson.dumps(request, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+    
+    @_api_retry
+    def _create_completion(self, request: Dict[str, Any]):
+        return self.client.chat.completions.create(**request)
+    
+    @_api_retry
+    async def _acreate_completion(self, client: AsyncOpenAI, request: Dict[str, Any]):
+        return await client.chat.completions.create(**request)
+    
+    def _build_request(self, case_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the chat completion arguments for one case."""
+        modality = self._detect_modality(case_data)
+        
+        # Prepare comprehensive context
+        context = self._prepare_case_context(case_data, modality)
+        
+        # Static modality instructions first, per-case details last
+        instructions = self.modality_prompts.get(modality, self.universal_prompt)
+        case_information = self._format_case_information(**context)
+        
+        # Call AI with deterministic settings to produce a structured, human-readable text ground truth
+        return {
+            "model": self.model_name,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are an expert radiologist extracting ground truth from medical case information. Provide accurate, conservative assessments based on the evidence presented. Respond with a structured, human-readable text document."
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": instructions},
+                        {"type": "text", "text": case_information}
+                    ]
+                }
+            ],
+            "temperature": 0.0,  # Deterministic results
+            "max_tokens": self._MAX_TOKENS.get(modality, self.DEFAULT_MAX_TOKENS)
+        }
+    
     def _detect_modality(self, case_data: Dict[str, Any]) -> str:
         """Detect the primary modality from case data."""
         modalities = case_data.get('modalities', [])
@@ -97,56 +272,40 @@ class DynamicGroundTruthGenerator:
             primary_modality = modalities[0].lower()
             
             # Normalize modality names
-            modality_map = {
-                'mammography': 'mammography',
-                'x-ray': 'x-ray',
-                'ct': 'ct',
-                'mri': 'mri',
-                'ultrasound': 'ultrasound'
-            }
-            
-            return modality_map.get(primary_modality, primary_modality)
+            return self._MODALITY_MAP.get(primary_modality, primary_modality)
         
         return 'unknown'
     
-    def _prepare_case_context(self, case_data: Dict[str, Any]) -> Dict[str, str]:
-        """Prepare comprehensive case context for AI analysis."""
+    def _prepare_case_context(self, case_data: Dict[str, Any], modality: str) -> Dict[str, str]:
+        """Prepare comprehensive case context for AI analysis (``modality`` from _detect_modality)."""
         
         # Extract image captions
         images = case_data.get('images', {})
-        caption = images.get('caption', '') if isinstance(images, dict) else ''
+        if not isinstance(images, dict):
+            images = {}
+        caption = images.get('caption', '')
         
         # Extract series information
-        series_info = []
-        if isinstance(images, dict) and 'series' in images:
-            for series in images['series']:
-                series_name = series.get('series_name', 'Unknown')
-                url_count = len(series.get('urls', []))
-                series_info.append(f"{series_name} ({url_count} images)")
+        series = images.get('series')
+        series_info = ', '.join(
+            f"{s.get('series_name', 'Unknown')} ({len(s.get('urls', []))} images)" for s in series
+        ) if series else 'No series information'
         
         return {
-            'modality': self._detect_modality(case_data),
+            'modality': modality,
             'patient_age': case_data.get('patient_age', 'Unknown'),
             'patient_gender': case_data.get('patient_gender', 'Unknown'),
             'presentation': case_data.get('presentation', 'No clinical information provided'),
             'case_discussion': case_data.get('case_discussion', 'No discussion provided'),
             'image_caption': caption,
-            'series_information': ', '.join(series_info) if series_info else 'No series information',
+            'series_information': series_info,
             'case_url': case_data.get('case_url', '')
         }
     
     def _get_mammography_prompt(self) -> str:
         """Prompt specifically designed for mammography ground truth extraction."""
         return """
-Analyze this mammography case and provide a comprehensive, human-readable ground truth assessment:
-
-**Case Information:**
-- Modality: {modality}
-- Patient: {patient_age}, {patient_gender}
-- Presentation: {presentation}
-- Image Caption: {image_caption}
-- Series: {series_information}
-- Expert Discussion: {case_discussion}
+Analyze the mammography case below and provide a comprehensive, human-readable ground truth assessment:
 
 **Provide a structured text assessment covering:**
 
@@ -174,15 +333,7 @@ Format your response as clear, structured text that a radiologist could easily r
     def _get_ct_prompt(self) -> str:
         """Prompt specifically designed for CT ground truth extraction."""
         return """
-Analyze this CT case and provide a comprehensive, human-readable ground truth assessment:
-
-**Case Information:**
-- Modality: {modality}
-- Patient: {patient_age}, {patient_gender}
-- Presentation: {presentation}
-- Image Caption: {image_caption}
-- Series: {series_information}
-- Expert Discussion: {case_discussion}
+Analyze the CT case below and provide a comprehensive, human-readable ground truth assessment:
 
 **Provide a structured text assessment covering:**
 
@@ -205,15 +356,7 @@ Format your response as clear, structured text that a radiologist could easily r
     def _get_mri_prompt(self) -> str:
         """Prompt specifically designed for MRI ground truth extraction."""
         return """
-Analyze this MRI case and provide a comprehensive, human-readable ground truth assessment:
-
-**Case Information:**
-- Modality: {modality}
-- Patient: {patient_age}, {patient_gender}
-- Presentation: {presentation}
-- Image Caption: {image_caption}
-- Series: {series_information}
-- Expert Discussion: {case_discussion}
+Analyze the MRI case below and provide a comprehensive, human-readable ground truth assessment:
 
 **Provide a structured text assessment covering:**
 
@@ -237,15 +380,7 @@ Format your response as clear, structured text that a radiologist could easily r
     def _get_ultrasound_prompt(self) -> str:
         """Prompt specifically designed for ultrasound ground truth extraction."""
         return """
-Analyze this ultrasound case and provide a comprehensive, human-readable ground truth assessment:
-
-**Case Information:**
-- Modality: {modality}
-- Patient: {patient_age}, {patient_gender}
-- Presentation: {presentation}
-- Image Caption: {image_caption}
-- Series: {series_information}
-- Expert Discussion: {case_discussion}
+Analyze the ultrasound case below and provide a comprehensive, human-readable ground truth assessment:
 
 **Provide a structured text assessment covering:**
 
@@ -267,15 +402,7 @@ Format your response as clear, structured text that a radiologist could easily r
     def _get_xray_prompt(self) -> str:
         """Prompt specifically designed for X-ray ground truth extraction."""
         return """
-Analyze this X-ray case and provide a comprehensive, human-readable ground truth assessment:
-
-**Case Information:**
-- Modality: {modality}
-- Patient: {patient_age}, {patient_gender}
-- Presentation: {presentation}
-- Image Caption: {image_caption}
-- Series: {series_information}
-- Expert Discussion: {case_discussion}
+Analyze the X-ray case below and provide a comprehensive, human-readable ground truth assessment:
 
 **Provide a structured text assessment covering:**
 
@@ -299,15 +426,7 @@ Format your response as clear, structured text that a radiologist could easily r
     def _get_universal_prompt(self) -> str:
         """Universal prompt for unknown or unsupported modalities."""
         return """
-Analyze this medical imaging case and extract the ground truth information:
-
-**Case Information:**
-- Modality: {modality}
-- Patient: {patient_age}, {patient_gender}
-- Presentation: {presentation}
-- Image Caption: {image_caption}
-- Series: {series_information}
-- Expert Discussion: {case_discussion}
+Analyze the medical imaging case below and extract the ground truth information:
 
 **Extract the following ground truth elements:**
 
@@ -340,42 +459,195 @@ Provide your analysis as JSON with these exact keys:
         }
     
     def batch_generate_ground_truth(self, cases: List[Dict[str, Any]], 
-                                  limit: Optional[int] = None) -> List[Dict[str, Any]]:
+                                  limit: Optional[int] = None,
+                                  skip: Container[int] = ()) -> Iterator[Dict[str, Any]]:
         """
-        Generate ground truth for multiple cases efficiently.
+        Generate ground truth for multiple cases efficiently (sync wrapper around
+        abatch_generate_ground_truth; must not be called from a running event loop).
+        
+        Records are yielded one at a time as they complete, so they can be streamed
+        straight into save_ground_truth_jsonl without holding the whole batch in
+        memory. Closing the iterator early cancels the requests still in flight.
         
         Args:
             cases: List of case data dictionaries
             limit: Optional limit on number of cases to process
+            skip: Case indices to leave out, e.g. completed_indices of an earlier run's output
             
-        Returns:
-            List of ground truth dictionaries
+        Yields:
+            Ground truth records (see _ground_truth_record), in completion order
+        """
+        loop = asyncio.new_event_loop()
+        records = self.abatch_generate_ground_truth(cases, limit, skip)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(records.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(records.aclose())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+    
+    async def abatch_generate_ground_truth(self, cases: List[Dict[str, Any]],
+                                         limit: Optional[int] = None,
+                                         skip: Container[int] = ()) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate ground truth for multiple cases concurrently.
+        
+        Requests overlap on one event loop, at most MAX_CONCURRENT_REQUESTS in
+        flight. Records (see _ground_truth_record) are yielded in completion
+        order; use their ``index`` to map back to ``cases``. Indices in ``skip``
+        are not requested.
         """
         if limit:
             cases = cases[:limit]
         
-        results = []
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        # Created per batch: the client's connection pool is bound to the running loop
+        client = AsyncOpenAI(base_url="https://openrouter.ai/api/v1", api_key=self.api_key, max_retries=0)
         
+        # Bucket cases by request so each distinct prompt is sent once
+        groups: Dict[str, List[int]] = {}
+        requests_by_key: Dict[str, Dict[str, Any]] = {}
+        failed: List[Dict[str, Any]] = []
         for i, case in enumerate(cases):
+            if i in skip:
+                continue
             try:
-                self.logger.info(f"Processing case {i+1}/{len(cases)}: {case.get('case_url', 'unknown')}")
-                ground_truth = self.generate_ground_truth(case)
-                results.append(ground_truth)
-                
+                request = self._build_request(case)
             except Exception as e:
                 self.logger.error(f"Failed to process case {i+1}: {e}")
-                results.append(self._fallback_ground_truth(case, str(e)))
+                failed.append(self._ground_truth_record(i, case, self._fallback_ground_truth(case, str(e))))
+                continue
+            key = self._request_key(request)
+            requests_by_key.setdefault(key, request)
+            groups.setdefault(key, []).append(i)
+        
+        if len(groups) < len(cases):
+            self.logger.info(f"Deduplicated {len(cases)} cases into {len(groups)} unique requests")
+        
+        async def bounded(key, indices):
+            first = indices[0]
+            case = cases[first]
+            async with semaphore:
+                self.logger.info(f"Processing case {first+1}/{len(cases)}: {case.get('case_url', 'unknown')}")
+                try:
+                    result = await self._agenerate_ground_truth(client, case, requests_by_key[key])
+                except Exception as e:
+                    self.logger.error(f"Failed to process case {first+1}: {e}")
+                    result = self._fallback_ground_truth(case, str(e))
+            
+            records = [self._ground_truth_record(first, case, result)]
+            for i in indices[1:]:
+                # Text is shared; a failure gets each case's own fallback record
+                if isinstance(result, dict):
+                    records.append(self._ground_truth_record(i, cases[i], self._fallback_ground_truth(cases[i], result.get('error', ''))))
+                else:
+                    records.append(self._ground_truth_record(i, cases[i], result))
+            return records
+        
+        tasks = [asyncio.ensure_future(bounded(key, indices)) for key, indices in groups.items()]
+        try:
+            for record in failed:
+                yield record
+            for next_done in asyncio.as_completed(tasks):
+                for record in await next_done:
+                    yield record
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await client.close()
+    
+    @staticmethod
+    def _ground_truth_record(index: int, case_data: Dict[str, Any], ground_truth: Any) -> Dict[str, Any]:
+        """JSONL record for one case's ground truth."""
+        return {
+            'index': index,
+            'case_url': case_data.get('case_url', ''),
+            'ground_truth': ground_truth
+        }
+    
+    def prepare_batch_jsonl(self, cases: List[Dict[str, Any]], output_file: Path) -> int:
+        """
+        Write one Batch API request line per case for offline submission.
+        
+        OpenRouter has no batch endpoint, so the file is meant to be submitted to a
+        provider that does (``/v1/chat/completions`` batch format). ``custom_id`` is
+        the case's index in ``cases``; use load_batch_results to map the output back.
+        
+        Returns:
+            Number of requests written
+        """
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for i, case in enumerate(cases):
+                f.write(json.dumps({
+                    "custom_id": str(i),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": self._build_request(case)
+                }, ensure_ascii=False) + "\n")
         
+        self.logger.info(f"Wrote {len(cases)} batch requests to {output_file}")
+        return len(cases)
+    
+    def load_batch_results(self, cases: List[Dict[str, Any]], batch_output_file: Path) -> List[Any]:
+        """
+        Map a Batch API output file back onto ``cases`` (same order as prepare_batch_jsonl).
+        
+        Cases whose request failed or is missing from the output get the usual fallback.
+        """
+        results: List[Any] = [None] * len(cases)
+        for record in load_jsonl(batch_output_file):
+            i = int(record["custom_id"])
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code", 200) != 200:
+                error = record.get("error") or response.get("body")
+                results[i] = self._fallback_ground_truth(cases[i], f"Batch request failed: {error}")
+            else:
+                results[i] = response["body"]["choices"][0]["message"]["content"]
+        
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = self._fallback_ground_truth(cases[i], "Missing from batch output")
         return results
     
-    def save_ground_truth_batch(self, ground_truth_data: List[Dict[str, Any]], 
-                               output_file: Path) -> None:
-        """Save generated ground truth to file."""
+    @staticmethod
+    def completed_indices(output_file: Path) -> Set[int]:
+        """
+        Indices of cases that already have ground truth in a save_ground_truth_jsonl file.
+        
+        Fallback records are not counted, so resuming with ``skip=`` retries them.
+        """
+        if not Path(output_file).exists():
+            return set()
+        return {
+            record['index'] for record in load_jsonl(output_file)
+            if isinstance(record.get('ground_truth'), str)
+        }
+    
+    def save_ground_truth_jsonl(self, records: Iterable[Any], output_file: Path) -> int:
+        """
+        Append ground truth records to a JSONL file, one compact line each.
+        
+        Records are written and flushed one at a time, so memory stays flat for
+        any number of records and everything written survives a crash.
+        
+        Returns:
+            Number of records written
+        """
+        count = 0
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(ground_truth_data, f, indent=2, ensure_ascii=False)
+            with open(output_file, 'ab') as f:
+                for record in records:
+                    f.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+                    f.flush()
+                    count += 1
             
-            self.logger.info(f"Saved {len(ground_truth_data)} ground truth records to {output_file}")
+            self.logger.info(f"Saved {count} ground truth records to {output_file}")
+            return count
             
         except Exception as e:
             self.logger.error(f"Failed to save ground truth to {output_file}: {e}")
@@ -3,16 +3,17 @@ Radiology Report Generation with Multi-Step Reasoning
 Leverages existing reasoning engine for diagnostic report generation.
 """
 
-import json
-import os
 import sys
 import argparse
 import traceback
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Literal
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from dotenv import load_dotenv
 from tqdm import tqdm
 from datetime import datetime
+import orjson
 
 # Add project root to Python path
 project_root = Path(__file__).resolve().parent.parent.parent.parent
@@ -22,6 +23,7 @@ from core.reasoning_engine import (
     ReasoningConfig,
     MultimodalGPT,
     ReasoningStrategies,
+    BatchedTextCaller,
     synthesize_natural_reasoning,
 )
 from providers.radiopedia.radiology_question_generator import RadiologyQuestionGenerator
@@ -29,6 +31,7 @@ from providers.i_am_handwriting.iam_utils import (
     ProgressTracker,
     IncrementalResultSaver,
     RecoveryManager,
+    write_json_array,
 )
 from providers.radiopedia.dynamic_ground_truth_generator import (
     DynamicGroundTruthGenerator,
@@ -36,6 +39,36 @@ from providers.radiopedia.dynamic_ground_truth_generator import (
 
 load_dotenv(project_root / ".env")
 
+# Normalizes "-" and "_" in modality names to spaces for the report format lookup
+_MODALITY_KEY_TRANSLATION = str.maketrans("-_", "  ")
+
+# Cases in flight when the config sets neither num_concurrent_cases nor num_processes
+DEFAULT_CONCURRENT_CASES = 8
+
+
+def _case_image_urls(case_data: dict) -> list:
+    """Flatten the image URLs of every series in a case."""
+    images_data = case_data.get("images", {})
+    if not isinstance(images_data, dict):
+        return []
+    return [url for series in images_data.get("series", ()) for url in series.get("urls", ())]
+
+
+# Case fields RadiologyQuestionGenerator.generate_question reads besides the modality
+_QUESTION_FIELDS = ("presentation", "patient_age", "patient_gender")
+
+
+@lru_cache(maxsize=4096)
+def _memo_generate_question(question_generator, modality, fields):
+    return question_generator.generate_question({"modalities": [modality], **dict(fields)})
+
+
+def _generate_question(question_generator: RadiologyQuestionGenerator, case_data: dict) -> str:
+    """Generate a case's question, reusing it for cases with identical question inputs."""
+    modality = case_data.get("modalities", ["unknown"])[0]
+    fields = tuple((key, case_data[key]) for key in _QUESTION_FIELDS if key in case_data)
+    return _memo_generate_question(question_generator, modality, fields)
+
 
 def process_radiology_case(
     case_data: dict,
@@ -45,6 +78,9 @@ def process_radiology_case(
     report_formats: dict,
     question_generator: RadiologyQuestionGenerator,
     process_id: int = 0,
+    gt_generator: DynamicGroundTruthGenerator = None,
+    text_caller: BatchedTextCaller = None,
+    gt_executor: ThreadPoolExecutor = None,
 ):
     """
     Process a single radiology case for report generation.
@@ -57,16 +93,20 @@ def process_radiology_case(
         report_formats: Report format templates from reports_prompts.json
         question_generator: RadiologyQuestionGenerator instance for generating diverse questions
         process_id: Process identifier for tracking
+        gt_generator: Shared DynamicGroundTruthGenerator (thread-safe); a new one is
+            created if omitted
+        text_caller: Shared BatchedTextCaller for the text-only final report and
+            validation calls; they go through gpt_instance directly if omitted
+        gt_executor: Shared executor that runs ground truth generation alongside the
+            initial model call; it is generated inline first if omitted
 
     Returns:
         Dictionary with processing results following consistent key naming
     """
+    ground_truth_future = None
     try:
         query_history = []
         response_history = []
-        # Generate text-based ground truth using the updated generator
-        gt_generator = DynamicGroundTruthGenerator()
-        ground_truth_text = gt_generator.generate_ground_truth(case_data)
 
         # Extract case information
         modality = case_data.get("modalities", ["unknown"])[0].lower()
@@ -78,12 +118,7 @@ def process_radiology_case(
         caption = case_data.get("caption", "")
 
         # Get image URLs from the structured format
-        image_urls = []
-        images_data = case_data.get("images", {})
-        if isinstance(images_data, dict) and "series" in images_data:
-            for series in images_data["series"]:
-                urls = series.get("urls", [])
-                image_urls.extend(urls)
+        image_urls = _case_image_urls(case_data)
 
         if not image_urls:
             return {
@@ -93,14 +128,23 @@ def process_radiology_case(
                 "status": "error",
             }
 
+        # Generate text-based ground truth using the updated generator. It is first
+        # needed by the strategies, so it runs alongside the initial report call.
+        if gt_generator is None:
+            gt_generator = DynamicGroundTruthGenerator()
+        if gt_executor is not None:
+            ground_truth_future = gt_executor.submit(gt_generator.generate_ground_truth, case_data)
+        else:
+            ground_truth_text = gt_generator.generate_ground_truth(case_data)
+
         # Get report format for this modality
-        modality_key = modality.replace("-", " ").replace("_", " ")
+        modality_key = modality.translate(_MODALITY_KEY_TRANSLATION)
         report_format = report_formats.get(
             modality_key, report_formats.get("chest x-ray", {})
         )
 
         # Generate diverse clinical question using the question generator
-        generated_question = question_generator.generate_question(case_data)
+        generated_question = _generate_question(question_generator, case_data)
 
         # Build comprehensive clinical question with report structure guidance
         if report_format.get("structure"):
@@ -136,6 +180,8 @@ Follow the structured reporting format for {modality} studies and provide detail
             additional_args={"max_tokens": prompts.get("max_tokens", 25000)},
         )
         response_history.append(initial_model_response)
+        if ground_truth_future is not None:
+            ground_truth_text = ground_truth_future.result()
 
         # 3. Apply reasoning strategies for clinical verification
         context_data = {
@@ -186,7 +232,8 @@ Follow the structured reporting format for {modality} studies and provide detail
 
         query_history.append(final_report_query)
 
-        final_structured_report = gpt_instance.text_only_call(
+        text_only_call = text_caller.submit if text_caller else gpt_instance.text_only_call
+        final_structured_report = text_only_call(
             content=final_report_query,
             additional_args={
                 "max_tokens": prompts.get("final_response_max_tokens", 20000)
@@ -203,7 +250,7 @@ Follow the structured reporting format for {modality} studies and provide detail
                     final_structured_report, ground_truth_text
                 )
 
-                validation_response = gpt_instance.text_only_call(
+                validation_response = text_only_call(
                     content=validation_prompt,
                     additional_args={"max_tokens": 20000, "temperature": 0.0},
                 )
@@ -249,6 +296,11 @@ Follow the structured reporting format for {modality} studies and provide detail
             "traceback": traceback.format_exc(),
             "status": "error",
         }
+    finally:
+        # If the initial call failed, don't leave the ground truth request running
+        # unowned: drop it if it hasn't started, otherwise wait for it to finish
+        if ground_truth_future is not None and not ground_truth_future.cancel():
+            wait([ground_truth_future])
 
 
 def load_modality_cases(modality: str, data_dir: Path, limit: int = None):
@@ -258,8 +310,8 @@ def load_modality_cases(modality: str, data_dir: Path, limit: int = None):
     if not modality_file.exists():
         raise FileNotFoundError(f"No cases found for modality: {modality}")
 
-    with open(modality_file, "r", encoding="utf-8") as f:
-        cases = json.load(f)
+    with open(modality_file, "rb") as f:
+        cases = orjson.loads(f.read())
 
     if limit:
         cases = cases[:limit]
@@ -271,6 +323,31 @@ def load_modality_cases(modality: str, data_dir: Path, limit: int = None):
     return cases
 
 
+def dedupe_cases(cases: list) -> list:
+    """
+    Drop repeated cases, keeping the first occurrence.
+
+    Cases are keyed on ``case_url``, or on their set of image URLs when the URL
+    is missing; cases with neither are always kept.
+    """
+    seen = set()
+    unique_cases = []
+    for case in cases:
+        key = case.get("case_url")
+        if not key:
+            image_urls = _case_image_urls(case)
+            key = ("images", tuple(sorted(image_urls))) if image_urls else None
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        unique_cases.append(case)
+
+    if len(unique_cases) < len(cases):
+        print(f"Removed {len(cases) - len(unique_cases)} duplicate cases")
+    return unique_cases
+
+
 def load_report_formats(config_dir: Path):
     """Load report format templates."""
     reports_file = config_dir / "reports prompts.json"
@@ -278,8 +355,8 @@ def load_report_formats(config_dir: Path):
     if not reports_file.exists():
         raise FileNotFoundError(f"Report formats not found: {reports_file}")
 
-    with open(reports_file, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(reports_file, "rb") as f:
+        return orjson.loads(f.read())
 
 
 def run_radiopedia_report_reasoning(
@@ -287,6 +364,7 @@ def run_radiopedia_report_reasoning(
     config_path: str = None,
     limit: int = None,
     resume: bool = True,
+    recovery_mode: Literal["ask", "auto", "never"] = "auto",
 ):
     """
     Main function to run the Radiopaedia report generation pipeline.
@@ -296,6 +374,8 @@ def run_radiopedia_report_reasoning(
         config_path: Path to reasoning config file
         limit: Limit number of cases to process
         resume: Whether to resume from previous progress
+        recovery_mode: How to handle incomplete runs when resuming: "auto" resumes
+            the most recent one, "never" starts fresh, "ask" prompts on stdin
     """
     try:
         # Initialize reasoning components
@@ -310,14 +390,13 @@ def run_radiopedia_report_reasoning(
         pipeline_config = reasoning_config_obj.config
         prompts_config = reasoning_config_obj.prompts
 
-        # Initialize question generator
-        question_generator = RadiologyQuestionGenerator()
-
         # Load report formats
         report_formats = load_report_formats(reasoning_config_obj.config_dir)
 
-        # Initialize question generator for diverse questions
+        # Shared across worker threads: question generator for diverse questions and
+        # ground truth generator (one API client and response cache for the whole run)
         question_generator = RadiologyQuestionGenerator()
+        gt_generator = DynamicGroundTruthGenerator()
 
         # Load modality cases
         data_dir = (
@@ -325,7 +404,7 @@ def run_radiopedia_report_reasoning(
         )
 
         if modality:
-            cases = load_modality_cases(modality, data_dir, limit)
+            cases = dedupe_cases(load_modality_cases(modality, data_dir, limit))
             print(f"Processing {len(cases)} {modality} cases")
         else:
             # Process all modalities
@@ -337,7 +416,8 @@ def run_radiopedia_report_reasoning(
                     all_cases.extend(mod_cases)
                 except FileNotFoundError:
                     print(f"No cases found for {mod}, skipping...")
-            cases = all_cases
+            # Radiopaedia cases can be listed under more than one modality
+            cases = dedupe_cases(all_cases)
             print(f"Processing {len(cases)} cases across all modalities")
 
         if not cases:
@@ -359,21 +439,35 @@ def run_radiopedia_report_reasoning(
 
         # Check for recovery options if resume is enabled
         recovery_manager = RecoveryManager(output_dir)
-        if resume:
-            incomplete_runs = recovery_manager.find_incomplete_runs()
+        if resume and recovery_mode != "never":
+            # Only unfinished runs over the same modality selection can be resumed:
+            # process_ids restart at 0 per modality, so another run's progress
+            # would skip the wrong cases
+            run_prefix = f"radiopedia_report_reasoning{modality_suffix}_"
+            incomplete_runs = [
+                run
+                for run in recovery_manager.find_incomplete_runs()
+                if Path(run["results_file"]).name.startswith(run_prefix)
+                and run["processed_count"] < len(cases)
+            ]
             if incomplete_runs:
                 print("\n" + "=" * 60)
                 print("RECOVERY OPTIONS AVAILABLE")
                 print("=" * 60)
-                suggestions = recovery_manager.suggest_recovery_options(len(cases))
+                suggestions = recovery_manager.suggest_recovery_options(
+                    len(cases), incomplete_runs
+                )
                 print(suggestions)
 
-                response = (
-                    input("Do you want to resume from the most recent run? (y/n): ")
-                    .strip()
-                    .lower()
-                )
-                if response == "y" and incomplete_runs:
+                if recovery_mode == "ask":
+                    response = (
+                        input("Do you want to resume from the most recent run? (y/n): ")
+                        .strip()
+                        .lower()
+                    )
+                else:
+                    response = "y"
+                if response == "y":
                     latest_run = max(incomplete_runs, key=lambda x: x["last_updated"])
                     results_file = Path(latest_run["results_file"])
                     print(f"Resuming from: {results_file}")
@@ -388,11 +482,10 @@ def run_radiopedia_report_reasoning(
         result_saver = IncrementalResultSaver(str(results_file))
 
         # Filter out already processed samples
-        remaining_cases = []
-        for case in cases:
-            item_id = case.get("process_id", "unknown")
-            if not progress_tracker.is_processed(str(item_id)):
-                remaining_cases.append(case)
+        processed_ids = progress_tracker.snapshot_processed()
+        remaining_cases = [
+            case for case in cases if str(case.get("process_id", "unknown")) not in processed_ids
+        ]
 
         if not remaining_cases:
             print("All cases have already been processed!")
@@ -404,15 +497,30 @@ def run_radiopedia_report_reasoning(
         )
 
         # Create backup of existing results
-        if results_file.exists():
+        if result_saver.log_file.exists():
             backup_file = result_saver.backup_results()
             if backup_file:
                 print(f"Created backup: {backup_file}")
 
-        results = []
-        num_workers = pipeline_config.get("num_processes", os.cpu_count() or 1)
+        # Cases are I/O-bound; requests_per_minute (see MultimodalGPT) keeps the
+        # fan-out under the provider's rate limit
+        num_workers = pipeline_config.get(
+            "num_concurrent_cases", pipeline_config.get("num_processes", DEFAULT_CONCURRENT_CASES)
+        )
+
+        # Final report and validation calls from all workers are sent in batches
+        text_batch_size = pipeline_config.get("text_batch_size", 16)
+        text_caller = (
+            BatchedTextCaller(gpt_instance, batch_size=text_batch_size)
+            if text_batch_size > 1
+            else None
+        )
 
-        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        # Each case has at most one ground truth request in flight, so the shared
+        # ground truth pool is sized like the case pool
+        with ThreadPoolExecutor(max_workers=num_workers) as executor, ThreadPoolExecutor(
+            max_workers=num_workers, thread_name_prefix="ground_truth"
+        ) as gt_executor:
             future_to_case = {
                 executor.submit(
                     process_radiology_case,
@@ -423,6 +531,9 @@ def run_radiopedia_report_reasoning(
                     report_formats,
                     question_generator,
                     case.get("process_id", idx),
+                    gt_generator,
+                    text_caller,
+                    gt_executor,
                 ): case
                 for idx, case in enumerate(remaining_cases)
             }
@@ -438,7 +549,6 @@ def run_radiopedia_report_reasoning(
 
                         # Save result immediately
                         result_saver.append_result(result)
-                        results.append(result)
 
                         # Mark as processed
                         item_id = str(case.get("process_id", "unknown"))
@@ -475,12 +585,17 @@ def run_radiopedia_report_reasoning(
                             "status": "error_in_future",
                         }
                         result_saver.append_result(error_result)
-                        results.append(error_result)
                         pbar.update(1)
 
+        if text_caller:
+            text_caller.close()
+
+        # Materialize the JSON results file from the append-only log
+        result_saver.finalize()
+        progress_tracker.close()
+
         # Final statistics
         stats = progress_tracker.get_stats()
-        all_results = result_saver.get_existing_results()
 
         print("\n" + "=" * 60)
         print("RADIOPEDIA REPORT REASONING COMPLETE")
@@ -490,33 +605,23 @@ def run_radiopedia_report_reasoning(
         print(f"Total processed: {stats['processed_count']}")
         print(f"Results saved to: {results_file}")
 
-        # Summary of results
-        successful_count = sum(1 for r in all_results if r.get("status") == "success")
-        error_count = len(all_results) - successful_count
-        print(f"Successful: {successful_count}")
-        print(f"Errors: {error_count}")
-
-        # Show sample results
-        for i, res in enumerate(all_results[: min(3, len(all_results))]):
-            print(f"\n--- Result {i+1} ---")
-            if res.get("status") == "success":
-                print(f"  Case URL: {res.get('case_url', 'N/A')}")
-                print(f"  Modality: {res.get('modality', 'N/A')}")
-                print(f"  Question: {res.get('Question', 'N/A')[:100]}...")
-                print(
-                    f"  Presentation: {res.get('patient_info', {}).get('presentation', 'N/A')[:100]}..."
-                )
-                print(f"  Diagnostic Report: {res.get('Response', 'N/A')[:100]}...")
-                print(f"  Strategies: {res.get('Strategies_Used')}")
-            else:
-                print(f"  Case URL: {res.get('case_url', 'N/A')}")
-                print(f"  Error: {res['error']}")
-
-        # Generate simplified output with consistent structure
-        simplified_results = []
-        for res in all_results:
-            if res.get("status") == "success":
-                simplified_item = {
+        # Results are streamed from the log in a single pass that writes the
+        # simplified output, counts outcomes and keeps the first few as samples
+        successful_count = 0
+        error_count = 0
+        sample_results = []
+
+        def simplified_results():
+            nonlocal successful_count, error_count
+            for res in result_saver.iter_existing_results():
+                if len(sample_results) < 3:
+                    sample_results.append(res)
+                if res.get("status") != "success":
+                    error_count += 1
+                    continue
+                successful_count += 1
+                # Generate simplified output with consistent structure
+                yield {
                     "process_id": res.get("process_id"),
                     "case_url": res.get("case_url"),
                     "modality": res.get("modality"),
@@ -540,13 +645,32 @@ def run_radiopedia_report_reasoning(
                     #     "presentation"
                     # ),
                 }
-                simplified_results.append(simplified_item)
 
         simplified_output_path = results_file.with_name(
             results_file.stem + "_simplified.json"
         )
-        with open(simplified_output_path, "w", encoding="utf-8") as f:
-            json.dump(simplified_results, f, indent=4)
+        write_json_array(simplified_output_path, simplified_results())
+
+        # Summary of results
+        print(f"Successful: {successful_count}")
+        print(f"Errors: {error_count}")
+
+        # Show sample results
+        for i, res in enumerate(sample_results):
+            print(f"\n--- Result {i+1} ---")
+            if res.get("status") == "success":
+                print(f"  Case URL: {res.get('case_url', 'N/A')}")
+                print(f"  Modality: {res.get('modality', 'N/A')}")
+                print(f"  Question: {res.get('Question', 'N/A')[:100]}...")
+                print(
+                    f"  Presentation: {res.get('patient_info', {}).get('presentation', 'N/A')[:100]}..."
+                )
+                print(f"  Diagnostic Report: {res.get('Response', 'N/A')[:100]}...")
+                print(f"  Strategies: {res.get('Strategies_Used')}")
+            else:
+                print(f"  Case URL: {res.get('case_url', 'N/A')}")
+                print(f"  Error: {res['error']}")
+
         print(f"Simplified results saved to: {simplified_output_path}")
 
     except FileNotFoundError as fnf_error:
@@ -577,6 +701,12 @@ if __name__ == "__main__":
         action="store_true",
         help="Start fresh without checking for previous progress",
     )
+    parser.add_argument(
+        "--recovery-mode",
+        choices=["ask", "auto", "never"],
+        default="auto",
+        help="How to handle incomplete runs: resume the latest automatically (default), prompt, or start fresh",
+    )
 
     args = parser.parse_args()
 
@@ -585,4 +715,5 @@ if __name__ == "__main__":
         config_path=args.config,
         limit=args.limit,
         resume=not args.no_resume,
+        recovery_mode=args.recovery_mode,
     )
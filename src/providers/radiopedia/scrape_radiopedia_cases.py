@@ -16,14 +16,35 @@ from tqdm import tqdm
 # Thread-local storage for WebDriver instances
 thread_local = threading.local()
 
+# Every driver ever started, so they can be quit once the pool is done
+# (thread-local attributes are not reachable from other threads)
+_drivers = []
+_drivers_lock = threading.Lock()
+
 def get_driver():
     """
     Get a thread-local WebDriver instance
     """
     if not hasattr(thread_local, "driver"):
-        thread_local.driver = setup_driver()
+        driver = setup_driver()
+        with _drivers_lock:
+            _drivers.append(driver)
+        thread_local.driver = driver
     return thread_local.driver
 
+def quit_all_drivers():
+    """
+    Quit every WebDriver started by get_driver
+    """
+    with _drivers_lock:
+        drivers = _drivers[:]
+        _drivers.clear()
+    for driver in drivers:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
 def setup_driver():
     """
     Set up and return a Chrome WebDriver instance
@@ -515,28 +536,24 @@ def process_case_urls(input_file, output_file, limit=None, max_workers=2):
     lock = threading.Lock()
     
     # Process URLs in parallel
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all tasks and track with tqdm for progress bar
-        futures = {executor.submit(process_single_url, url, output_file, lock): url for url in case_urls}
-        
-        # Process results as they complete
-        success_count = 0
-        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Scraping Progress"):
-            url = futures[future]
-            try:
-                success = future.result()
-                if success:
-                    success_count += 1
-            except Exception as e:
-                print(f"Error processing {url}: {str(e)}")
-    
-    # Clean up all drivers
-    for thread_id, thread in threading._active.copy().items():
-        if hasattr(thread, "driver"):
-            try:
-                thread.driver.quit()
-            except:
-                pass
+    success_count = 0
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Submit all tasks and track with tqdm for progress bar
+            futures = {executor.submit(process_single_url, url, output_file, lock): url for url in case_urls}
+            
+            # Process results as they complete
+            for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Scraping Progress"):
+                url = futures[future]
+                try:
+                    success = future.result()
+                    if success:
+                        success_count += 1
+                except Exception as e:
+                    print(f"Error processing {url}: {str(e)}")
+    finally:
+        # Clean up all drivers, even if scraping was interrupted
+        quit_all_drivers()
     
     print(f"Successfully processed {success_count} out of {len(case_urls)} cases.")
     print(f"Data saved to {output_file}")
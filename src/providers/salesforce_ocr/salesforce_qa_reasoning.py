@@ -283,7 +283,7 @@ def run_salesforce_qa_reasoning(
         print(f"Resuming processing: {len(remaining_qa_pairs)} remaining out of {len(qa_pairs)} total QA pairs")
         
         # Create backup of existing results
-        if results_file.exists():
+        if result_saver.log_file.exists():
             backup_file = result_saver.backup_results()
             if backup_file:
                 print(f"Created backup: {backup_file}")
@@ -342,6 +342,10 @@ def run_salesforce_qa_reasoning(
                         results.append(error_result)
                         pbar.update(1)
 
+        # Materialize the JSON results file from the append-only log
+        result_saver.finalize()
+        progress_tracker.close()
+
         # Final statistics
         stats = progress_tracker.get_stats()
         all_results = result_saver.get_existing_results()